@@ -0,0 +1,99 @@
+import os
+import json
+import stat
+import socketserver
+import threading
+from typing import Any, Callable, Dict, Optional
+from process import Processor
+
+
+def query_processor(processor: Processor, command: str, argument: Optional[int] = None) -> Any:
+    '''
+    Answer a query about the state of a processor
+    '''
+    if command == "current":
+        return processor.current_output()
+    if command == "results":
+        results = list(processor.recent_results)
+        return results[-argument:] if argument else results
+    if command == "window":
+        return {
+            "window_size": processor.window_size,
+            "minutes": len(processor.moving_window),
+            "current_minute": str(processor.event_current_minute) if processor.event_current_minute else None,
+        }
+    if command == "stats":
+        return {
+            "events": processor.events_count,
+            "late_events": processor.late_events_count,
+            "duplicates": processor.deduplicator.duplicates_count if processor.deduplicator is not None else 0,
+        }
+    raise ValueError(f"Unknown command: {command}")
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    '''
+    Answer each query line with a JSON line
+    '''
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            words = line.decode().split()
+            if not words:
+                continue
+            try:
+                if len(words) > 2:
+                    raise ValueError("Too many arguments")
+                argument = int(words[1]) if len(words) == 2 else None
+                if argument is not None and argument < 1:
+                    raise ValueError(f"The argument must be a positive integer: {argument}")
+                response = self.server.control.query(words[0], argument)
+            except ValueError as e:
+                response = {"error": str(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode())
+
+
+class ControlServer:
+    '''
+    Unix domain socket answering queries about the current window from a background thread:
+    - current -> Output of the minute still open
+    - results [N] -> Last N outputs emitted
+    - window -> Window size, minutes in the window and current minute
+    - stats -> Ingest counters
+    The queries only read the state of the processors, so they never block the processing.
+    With several pipelines, each answer maps the window size to the answer of its processor.
+    '''
+
+    def __init__(self, path: str, processors: Dict[Any, Processor],
+                 stats: Optional[Callable[[], Dict[str, Any]]] = None) -> None:
+        self.path = path
+        self.processors = processors
+        # Counters kept outside the processors, like the invalid lines
+        self.stats = stats
+
+        # Replace the socket left by a previous run, but never a regular file
+        if os.path.exists(path):
+            if not stat.S_ISSOCK(os.stat(path).st_mode):
+                raise ValueError(f"The control socket path '{path}' exists and is not a socket.")
+            os.unlink(path)
+
+        self.server = socketserver.ThreadingUnixStreamServer(path, ControlHandler)
+        self.server.daemon_threads = True
+        self.server.control = self
+        # Short poll interval, so closing the server doesn't delay the end of the run
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.1,), daemon=True)
+        self.thread.start()
+
+    def query(self, command: str, argument: Optional[int] = None) -> Any:
+        answers = {str(key): query_processor(processor, command, argument) for key, processor in self.processors.items()}
+        if command == "stats" and self.stats is not None:
+            for answer in answers.values():
+                answer.update(self.stats())
+        return answers[next(iter(answers))] if len(answers) == 1 else answers
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
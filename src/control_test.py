@@ -0,0 +1,122 @@
+import json
+import socket
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from process import Processor
+from control import ControlServer, query_processor
+
+
+@pytest.fixture
+def processor():
+    p = Processor(window_size=10, metric="maximum", history=2)
+    base = datetime(2025, 4, 20, 12, 0, 30)
+    for minute, duration in enumerate([10, 30, 20]):
+        p.process(SimpleNamespace(timestamp=base + timedelta(minutes=minute), duration=duration))
+    return p
+
+
+def ask(path, *queries):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(path))
+        stream = client.makefile("rw")
+        answers = []
+        for query in queries:
+            stream.write(query + "\n")
+            stream.flush()
+            answers.append(json.loads(stream.readline()))
+        return answers
+
+
+@pytest.mark.parametrize(
+    "command, argument, expected",
+    [
+        ("current", None, {"date": "2025-04-20 12:03:00", "max_delivery_time": 20}),
+        ("results", None, [{"date": "2025-04-20 12:01:00", "max_delivery_time": 10},
+                           {"date": "2025-04-20 12:02:00", "max_delivery_time": 30}]),
+        ("results", 1, [{"date": "2025-04-20 12:02:00", "max_delivery_time": 30}]),
+        ("window", None, {"window_size": 10, "minutes": 2, "current_minute": "2025-04-20 12:03:00"}),
+        ("stats", None, {"events": 3, "late_events": 0, "duplicates": 0}),
+    ],
+    ids=["current", "results", "last_result", "window", "stats"]
+)
+def test_query_processor(processor, command, argument, expected):
+    """
+    Test the answers about the state of the processor, the results are kept in a ring buffer of 2
+    """
+    assert query_processor(processor, command, argument) == expected
+
+
+def test_control_server(processor, tmp_path):
+    """
+    Test the queries over the socket, including the counters kept outside the processor
+    """
+    path = tmp_path / "control.sock"
+    server = ControlServer(str(path), {10: processor}, lambda: {"bad_lines": 4})
+    try:
+        current, stats, unknown, invalid = ask(path, "current", "stats", "unknown", "results many")
+    finally:
+        server.close()
+
+    assert current == {"date": "2025-04-20 12:03:00", "max_delivery_time": 20}
+    assert stats == {"events": 3, "late_events": 0, "duplicates": 0, "bad_lines": 4}
+    assert unknown == {"error": "Unknown command: unknown"}
+    assert "error" in invalid
+    assert not path.exists()
+
+
+@pytest.mark.parametrize(
+    "query, error",
+    [
+        ("results many", "invalid literal for int()"),
+        ("results -3", "The argument must be a positive integer: -3"),
+        ("results 0", "The argument must be a positive integer: 0"),
+        ("results 1 2", "Too many arguments"),
+    ],
+    ids=["not_integer", "negative", "zero", "too_many_arguments"]
+)
+def test_control_server_invalid_queries(processor, tmp_path, query, error):
+    """
+    Test that the invalid arguments are answered with an error, and the next queries still work
+    """
+    path = tmp_path / "control.sock"
+    server = ControlServer(str(path), {10: processor})
+    try:
+        invalid, results = ask(path, query, "results 1")
+    finally:
+        server.close()
+
+    assert error in invalid["error"]
+    assert results == [{"date": "2025-04-20 12:02:00", "max_delivery_time": 30}]
+
+
+def test_control_server_several_processors(processor, tmp_path):
+    """
+    Test that with several pipelines the answers are keyed by window size
+    """
+    path = tmp_path / "control.sock"
+    server = ControlServer(str(path), {10: processor, 5: Processor(window_size=5, metric="maximum")})
+    try:
+        [window] = ask(path, "window")
+    finally:
+        server.close()
+
+    assert window["5"] == {"window_size": 5, "minutes": 0, "current_minute": None}
+    assert window["10"]["minutes"] == 2
+
+
+def test_control_server_replaces_stale_socket(processor, tmp_path):
+    """
+    Test that a socket left by a previous run is replaced, but a regular file is not
+    """
+    path = tmp_path / "control.sock"
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(path))
+    stale.close()
+    server = ControlServer(str(path), {10: processor})
+    server.close()
+
+    regular = tmp_path / "file"
+    regular.write_text("data")
+    with pytest.raises(ValueError, match="exists and is not a socket"):
+        ControlServer(str(regular), {10: processor})
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Deque, Dict, Hashable, List, Tuple
+from collections import deque
+
+
+class Deduplicator:
+    '''
+    Class to detect replayed events, remembering their keys only for the window horizon.
+    Keys are grouped in buckets by minute, so expiring them costs O(1) per event.
+    '''
+
+    def __init__(self) -> None:
+        # Last minute each key was seen in
+        self.seen: Dict[Hashable, datetime] = {}
+        # Keys seen in each minute, oldest minute first
+        self.buckets: Deque[Tuple[datetime, List[Hashable]]] = deque()
+        self.duplicates_count = 0
+
+    def is_duplicate(self, key: Hashable, minute: datetime) -> bool:
+        '''
+        Check if the key was already seen, remembering it for the minute otherwise
+        '''
+        if key in self.seen:
+            self.duplicates_count += 1
+            return True
+
+        self.seen[key] = minute
+        if not self.buckets or self.buckets[-1][0] != minute:
+            self.buckets.append((minute, []))
+        self.buckets[-1][1].append(key)
+        return False
+
+    def expire(self, to_popleft: datetime) -> None:
+        '''
+        Forget the keys of the minutes that ended before to_popleft
+        '''
+        while self.buckets and self.buckets[0][0] <= to_popleft:
+            minute, keys = self.buckets.popleft()
+            for key in keys:
+                if self.seen.get(key) == minute:
+                    del self.seen[key]
@@ -0,0 +1,44 @@
+import pytest
+from datetime import datetime
+from dedup import Deduplicator
+
+def test_is_duplicate():
+    """
+    Test that a key is only reported as duplicate after it was seen
+    """
+    dedup = Deduplicator()
+    minute = datetime(2025, 4, 20, 12, 1)
+    assert not dedup.is_duplicate(("a", "translation_delivered"), minute)
+    assert not dedup.is_duplicate(("a", "translation_requested"), minute)
+    assert dedup.is_duplicate(("a", "translation_delivered"), minute)
+    assert dedup.duplicates_count == 1
+
+@pytest.mark.parametrize(
+    "to_popleft, expected_remembered",
+    [
+        # Nothing ended yet
+        (datetime(2025, 4, 20, 12, 0), ["a", "b", "c"]),
+        # The first minute ended
+        (datetime(2025, 4, 20, 12, 1), ["b", "c"]),
+        # Every minute ended
+        (datetime(2025, 4, 20, 12, 5), []),
+    ],
+    ids=[
+        "nothing_expired",
+        "first_minute_expired",
+        "all_expired"
+    ]
+)
+def test_expire(to_popleft, expected_remembered):
+    """
+    Test that keys are forgotten once their minute is out of the window
+    """
+    dedup = Deduplicator()
+    dedup.is_duplicate("a", datetime(2025, 4, 20, 12, 1))
+    dedup.is_duplicate("b", datetime(2025, 4, 20, 12, 2))
+    dedup.is_duplicate("c", datetime(2025, 4, 20, 12, 2))
+
+    dedup.expire(to_popleft)
+
+    assert sorted(dedup.seen) == expected_remembered
+    assert sum(len(keys) for _, keys in dedup.buckets) == len(expected_remembered)
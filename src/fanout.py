@@ -0,0 +1,123 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from process import MultiMetricProcessor
+from write import Writer
+from metrics_ import get_metric
+from values import Event
+
+# Record routed to the writer of its pipeline
+Routed = Tuple[Writer, Dict[str, Any]]
+
+
+def load_config(filename: str) -> Dict[str, Any]:
+    '''
+    Load the pipelines configuration from a JSON or TOML file
+    '''
+    if filename.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            raise ValueError("TOML configuration files require Python 3.11 or later.")
+        with open(filename, 'rb') as f:
+            config = tomllib.load(f)
+    else:
+        with open(filename, 'r') as f:
+            config = json.load(f)
+
+    pipelines = config.get("pipelines")
+    if not pipelines:
+        raise ValueError("The configuration must declare at least one pipeline.")
+
+    for pipeline in pipelines:
+        window_size = pipeline.get("window_size")
+        if not isinstance(window_size, int) or window_size <= 0:
+            raise ValueError("The window size must be a positive integer.")
+        pipeline.setdefault("metric", "moving_average")
+        pipeline.setdefault("output", "output.json")
+        try:
+            get_metric(pipeline["metric"])
+        except ValueError:
+            raise ValueError(f"Unsupported metric: {pipeline['metric']}")
+
+    return config
+
+
+class FanOut:
+    '''
+    Class to dispatch each parsed event to several pipelines (processor and writer pairs).
+    Pipelines with the same window size share a single moving window.
+    '''
+
+    def __init__(self, pipelines: List[Dict[str, Any]], **options: Any) -> None:
+        # Writers of each metric, grouped by window size
+        self.routes: Dict[int, Dict[str, List[Writer]]] = {}
+        self.writers: List[Writer] = []
+        for pipeline in pipelines:
+            writer = Writer(pipeline["output"], pipeline.get("changes_only", False), pipeline.get("heartbeat"),
+                            pipeline.get("background", False), pipeline.get("fsync", False))
+            metrics = self.routes.setdefault(pipeline["window_size"], {})
+            metrics.setdefault(pipeline["metric"], []).append(writer)
+            self.writers.append(writer)
+
+        self.processors: Dict[int, MultiMetricProcessor] = {
+            window_size: MultiMetricProcessor(window_size, list(metrics), **options)
+            for window_size, metrics in self.routes.items()
+        }
+
+    def route(self, window_size: int, result: Any) -> List[Routed]:
+        '''
+        Route the outputs of a processor to the writers of each metric
+        '''
+        if not result:
+            return []
+
+        routed: List[Routed] = []
+        for outputs in (result if isinstance(result, list) else [result]):
+            for metric, output in outputs.items():
+                for writer in self.routes[window_size][metric]:
+                    routed.append((writer, output))
+        return routed
+
+    def process(self, event: Event) -> List[Routed]:
+        '''
+        Process the event in every processor
+        '''
+        routed: List[Routed] = []
+        for window_size, processor in self.processors.items():
+            routed.extend(self.route(window_size, processor.process(event)))
+        return routed
+
+    def close_elapsed_minutes(self, now: Optional[Any] = None) -> List[Routed]:
+        '''
+        Emit the minutes that ended on the wall clock in every processor
+        '''
+        routed: List[Routed] = []
+        for window_size, processor in self.processors.items():
+            routed.extend(self.route(window_size, processor.close_elapsed_minutes(now)))
+        return routed
+
+    def finalize(self) -> List[Routed]:
+        '''
+        Generate the final output of every processor
+        '''
+        routed: List[Routed] = []
+        for window_size, processor in self.processors.items():
+            routed.extend(self.route(window_size, processor.finalize()))
+        return routed
+
+
+class FanOutWriter:
+    '''
+    Class to write the records routed by FanOut to the writer of their pipeline
+    '''
+
+    def __init__(self, writers: List[Writer]) -> None:
+        self.writers = writers
+
+    def write(self, routed: Routed) -> None:
+        writer, result = routed
+        writer.write(result)
+
+    def close(self) -> None:
+        for writer in self.writers:
+            writer.close()
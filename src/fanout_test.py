@@ -0,0 +1,101 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from fanout import FanOut, FanOutWriter, load_config
+
+PIPELINES = [
+    {"window_size": 10, "metric": "moving_average", "output": "avg_10.json"},
+    {"window_size": 10, "metric": "maximum", "output": "max_10.json"},
+    {"window_size": 10, "metric": "maximum", "output": "cli"},
+    {"window_size": 2, "metric": "maximum", "output": "max_2.json"},
+]
+
+@pytest.mark.parametrize(
+    "filename, content",
+    [
+        ("config.json", json.dumps({"input_file": "events.json", "pipelines": [{"window_size": 5}]})),
+        ("config.toml", 'input_file = "events.json"\n[[pipelines]]\nwindow_size = 5\n'),
+    ],
+    ids=[
+        "json",
+        "toml"
+    ]
+)
+def test_load_config(tmp_path, filename, content):
+    """
+    Test loading the configuration with the defaults of each pipeline
+    """
+    config_file = tmp_path / filename
+    config_file.write_text(content)
+
+    config = load_config(str(config_file))
+
+    assert config["input_file"] == "events.json"
+    assert config["pipelines"] == [{"window_size": 5, "metric": "moving_average", "output": "output.json"}]
+
+@pytest.mark.parametrize(
+    "pipelines, message",
+    [
+        ([], "at least one pipeline"),
+        ([{"window_size": 0}], "The window size must be a positive integer."),
+        ([{"window_size": 5, "metric": "unknown"}], "Unsupported metric"),
+    ],
+    ids=[
+        "no_pipelines",
+        "invalid_window_size",
+        "invalid_metric"
+    ]
+)
+def test_load_config_invalid(tmp_path, pipelines, message):
+    """
+    Test that invalid configurations raise ValueError
+    """
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({"input_file": "events.json", "pipelines": pipelines}))
+
+    with pytest.raises(ValueError, match=message):
+        load_config(str(config_file))
+
+def test_fanout_shares_window_by_size():
+    """
+    Test that pipelines with the same window size share a processor
+    """
+    fanout = FanOut(PIPELINES)
+
+    assert sorted(fanout.processors) == [2, 10]
+    assert list(fanout.processors[10].metrics) == ["moving_average", "maximum"]
+    assert len(fanout.routes[10]["maximum"]) == 2
+
+def test_fanout_routes_outputs():
+    """
+    Test that each output is routed to the writers of its metric and window size
+    """
+    fanout = FanOut(PIPELINES)
+    base = datetime(2025, 4, 20, 12, 0, 30)
+    for minutes, duration in [(0, 10), (1, 30), (4, 20)]:
+        fanout.process(SimpleNamespace(timestamp=base + timedelta(minutes=minutes), duration=duration))
+
+    written = {}
+    for writer, result in fanout.finalize():
+        written.setdefault(writer.output_destiny, []).append(result)
+
+    assert written == {
+        "avg_10.json": [{"date": "2025-04-20 12:05:00", "average_delivery_time": 20}],
+        "max_10.json": [{"date": "2025-04-20 12:05:00", "max_delivery_time": 30}],
+        "cli": [{"date": "2025-04-20 12:05:00", "max_delivery_time": 30}],
+        "max_2.json": [{"date": "2025-04-20 12:05:00", "max_delivery_time": 20}],
+    }
+
+def test_fanout_writer(tmp_path):
+    """
+    Test that FanOutWriter writes each record with the writer it was routed to
+    """
+    fanout = FanOut([{"window_size": 1, "metric": "maximum", "output": str(tmp_path / "out.json")}])
+    routed = fanout.process(SimpleNamespace(timestamp=datetime(2025, 4, 20, 12, 0, 30), duration=10))
+
+    writer = FanOutWriter(fanout.writers)
+    for r in routed:
+        writer.write(r)
+
+    assert json.loads((tmp_path / "out.json").read_text()) == {"date": "2025-04-20 12:00:00", "max_delivery_time": 0.0}
@@ -0,0 +1,52 @@
+import pytest
+from hll import HyperLogLog
+
+
+@pytest.mark.parametrize(
+    "cardinality",
+    [0, 1, 10, 1000, 10000, 100000],
+    ids=["empty", "one", "small", "thousand", "ten_thousand", "hundred_thousand"]
+)
+def test_estimate_close_to_exact(cardinality):
+    """
+    Test the estimate against the exact number of distinct keys, within 3 standard errors (5%)
+    """
+    sketch = HyperLogLog()
+    for i in range(cardinality):
+        # Every key is added twice, duplicates don't change the estimate
+        sketch.add(f"client-{i}".encode())
+        sketch.add(f"client-{i}".encode())
+
+    assert sketch.estimate() == pytest.approx(cardinality, rel=0.05, abs=0.5)
+
+
+def test_merge_is_union():
+    """
+    Test that merging two sketches estimates the distinct keys of both
+    """
+    first, second = HyperLogLog(), HyperLogLog()
+    for i in range(6000):
+        first.add(str(i).encode())
+    for i in range(3000, 9000):
+        second.add(str(i).encode())
+
+    copy = first.copy()
+    first.merge(second)
+    assert first.estimate() == pytest.approx(9000, rel=0.05)
+    assert copy.estimate() == pytest.approx(6000, rel=0.05)
+
+
+def test_merge_different_precision():
+    """
+    Test that only sketches with the same precision can be merged
+    """
+    with pytest.raises(ValueError, match="same precision"):
+        HyperLogLog(10).merge(HyperLogLog(12))
+
+
+def test_invalid_precision():
+    """
+    Test that the precision must be between 4 and 16
+    """
+    with pytest.raises(ValueError, match="The precision must be between 4 and 16"):
+        HyperLogLog(20)
@@ -1,3 +1,12 @@
+import copy
+import heapq
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+# Entry point group where other packages register their metrics
+METRIC_ENTRY_POINT_GROUP = "unbabel_cli.metrics"
+
+
 class Metrics:
     '''
     Class with the available metrics
@@ -7,52 +16,404 @@ class Metrics:
         Base compute method that should be overridden by subclasses.
         """
         raise NotImplementedError("Subclasses must implement compute method")
-    
 
-class MovingAverage(Metrics):
+
+class IncrementalMetric(Metrics):
+    '''
+    Metric computed from partial aggregates instead of the whole window.
+    The processor keeps one partial per minute: events are added to the partial of their minute,
+    and the partials of the window are merged, so each event costs O(1).
+    Subclasses implement add, merge and result; invertible metrics also implement evict,
+    so the window only subtracts the minute that leaves it.
+    '''
+    # Key of the value in the output records
+    output_field = "value"
+    # The partial of a minute can be subtracted from the aggregate of the window
+    invertible = False
+    # False for metrics over the whole stream, that are never evicted
+    windowed = True
+    # Class of the partials when they are shared with other metrics, the metric itself otherwise
+    partial: Optional[Type["IncrementalMetric"]] = None
+    # Only reads the timestamp, duration and nr_words of the events, so it can use the parse workers
+    numeric_only = True
+    # Minutes covered by an aggregate when they are more than the window size, for the rates
+    span: Optional[float] = None
+
+    def add(self, event) -> None:
+        '''
+        Add the event to the partial
+        '''
+        raise NotImplementedError("Subclasses must implement add method")
+
+    def merge(self, other: "IncrementalMetric") -> None:
+        '''
+        Merge in place the partial of the events that came after the ones of this partial
+        '''
+        raise NotImplementedError("Subclasses must implement merge method")
+
+    def evict(self, other: "IncrementalMetric") -> None:
+        '''
+        Remove in place the partial of the oldest events, only for invertible metrics
+        '''
+        raise NotImplementedError("Subclasses must implement evict method")
+
+    def result(self) -> float:
+        '''
+        Value of the metric for the events of the partial
+        '''
+        raise NotImplementedError("Subclasses must implement result method")
+
+    @classmethod
+    def summarize(cls, partial: "IncrementalMetric") -> float:
+        '''
+        Value of the metric for the aggregate of the partials of the window
+        '''
+        return partial.result()
+
+    def copy(self) -> "IncrementalMetric":
+        '''
+        Independent copy of the partial, metrics with mutable state must override it
+        '''
+        return copy.copy(self)
+
+    def compute(self, events: Iterable) -> float:
+        '''
+        Value of the metric for a list of events
+        '''
+        partial = type(self)()
+        for event in events:
+            partial.add(event)
+        return partial.result()
+
+
+# Metrics selectable by name, including the ones registered by other packages
+available_metrics: Dict[str, Type[IncrementalMetric]] = {}
+plugins_loaded = False
+
+
+def register_metric(name: str) -> Callable[[Type[IncrementalMetric]], Type[IncrementalMetric]]:
+    '''
+    Class decorator to make an incremental metric selectable by name
+    '''
+    def register(metric: Type[IncrementalMetric]) -> Type[IncrementalMetric]:
+        if not (isinstance(metric, type) and issubclass(metric, IncrementalMetric)):
+            raise TypeError(f"The metric {name} must be a subclass of IncrementalMetric")
+        available_metrics[name] = metric
+        return metric
+    return register
+
+
+def load_metric_plugins() -> None:
+    '''
+    Register the metrics declared by the installed packages in the unbabel_cli.metrics entry point group.
+    Loaded only once, and only when a metric is not built in, to keep the startup fast.
+    '''
+    global plugins_loaded
+    if plugins_loaded:
+        return
+    plugins_loaded = True
+
+    from importlib.metadata import entry_points
+    try:
+        metric_entry_points = entry_points(group=METRIC_ENTRY_POINT_GROUP)
+    except TypeError:  # Python < 3.10, the entry points are returned by group
+        metric_entry_points = entry_points().get(METRIC_ENTRY_POINT_GROUP, [])
+    for entry_point in metric_entry_points:
+        if entry_point.name not in available_metrics:
+            register_metric(entry_point.name)(entry_point.load())
+
+
+def get_metric(name: str) -> Type[IncrementalMetric]:
+    '''
+    Return the metric registered with the name, looking in the plugins when it isn't built in
+    '''
+    if name not in available_metrics:
+        load_metric_plugins()
+    if name not in available_metrics:
+        raise ValueError("Unsupported metric")
+    return available_metrics[name]
+
+
+def configure_metric(metric: Type[IncrementalMetric], options: Dict[str, Any]) -> Type[IncrementalMetric]:
+    '''
+    Subclass of the metric with the options it declares as class attributes, the others are ignored
+    '''
+    overrides = {name: value for name, value in options.items() if value is not None and hasattr(metric, name)}
+    if not overrides:
+        return metric
+    return type(metric.__name__, (metric,), overrides)
+
+
+@register_metric("moving_average")
+class MovingAverage(IncrementalMetric):
     '''
     Calculates the moving average of the events
     '''
-    #Note:
-    # For cases with a huge amount of data:
-    # Only need to calculate the first MA with all the data, 
-    # after that it can be calculated adding the new data and removing data out of the time window 
-    # and add the previous MA calculated
-        
-    def compute(self, events: list) -> float:
-        # Check if events is empty
-        if not events:
+    output_field = "average_delivery_time"
+    invertible = True
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, event) -> None:
+        self.count += 1
+        self.total += event.duration
+
+    def merge(self, other: "MovingAverage") -> None:
+        self.count += other.count
+        self.total += other.total
+
+    def evict(self, other: "MovingAverage") -> None:
+        self.count -= other.count
+        # Reset the sum of an empty window, so rounding errors don't accumulate
+        self.total = self.total - other.total if self.count else 0.0
+
+    def result(self) -> float:
+        if not self.count:
             return 0
-        
-        # Calculate the moving average
-        delivery_time = []
-        for event in events:
-            delivery_time.append(event.duration)
-        
-        ma = sum(delivery_time) / len(delivery_time)
-        return ma
-       
+        return self.total / self.count
+
+
 #Add other metrics
-class Maximum(Metrics):
+@register_metric("maximum")
+class Maximum(IncrementalMetric):
     '''
     Calculates the maximum of the events
     '''
-    
-    def compute(self, events: list) -> float:
-        
-        # Check if events is empty
-        if not events:
+    output_field = "max_delivery_time"
+
+    def __init__(self) -> None:
+        self.value = None
+
+    def add(self, event) -> None:
+        if self.value is None or event.duration > self.value:
+            self.value = event.duration
+
+    def merge(self, other: "Maximum") -> None:
+        if other.value is not None and (self.value is None or other.value > self.value):
+            self.value = other.value
+
+    def result(self) -> float:
+        if self.value is None:
             return 0
-        
-        # Calculate the maximum
-        delivery_time = []
-        for event in events:
-            delivery_time.append(event.duration)
-        
-        max_value = max(delivery_time)
-        return max_value
-    
-available_metrics = {
-    "moving_average": MovingAverage,
-    "maximum": Maximum
-}
\ No newline at end of file
+        return self.value
+
+
+@register_metric("ewma")
+class ExponentialMovingAverage(IncrementalMetric):
+    '''
+    Calculates the exponentially weighted moving average of the events over the whole stream.
+    The weight of an event halves every half_life minutes, relative to the latest event.
+    Only the weighted sum and the total weight are kept, scaled to the latest timestamp,
+    so gaps are decayed in one step whatever their length.
+    '''
+    output_field = "ewma_delivery_time"
+    windowed = False
+    # Minutes for the weight of an event to halve
+    half_life = 5.0
+
+    def __init__(self) -> None:
+        # Timestamp where the weight of an event is 1
+        self.reference = None
+        self.weighted_total = 0.0
+        self.weight = 0.0
+
+    def decay(self, elapsed: timedelta) -> float:
+        return 0.5 ** (elapsed.total_seconds() / 60 / self.half_life)
+
+    def rebase(self, reference) -> None:
+        '''
+        Move the reference to a later timestamp, decaying the weights accordingly
+        '''
+        if self.reference is not None:
+            factor = self.decay(reference - self.reference)
+            self.weighted_total *= factor
+            self.weight *= factor
+        self.reference = reference
+
+    def add(self, event) -> None:
+        if self.reference is None or event.timestamp > self.reference:
+            self.rebase(event.timestamp)
+        weight = self.decay(self.reference - event.timestamp)
+        self.weighted_total += weight * event.duration
+        self.weight += weight
+
+    def merge(self, other: "ExponentialMovingAverage") -> None:
+        if other.reference is None:
+            return
+        if self.reference is None or other.reference > self.reference:
+            self.rebase(other.reference)
+        factor = self.decay(self.reference - other.reference)
+        self.weighted_total += factor * other.weighted_total
+        self.weight += factor * other.weight
+
+    def result(self) -> float:
+        if not self.weight:
+            return 0
+        return self.weighted_total / self.weight
+
+
+class Totals(IncrementalMetric):
+    '''
+    Number of events, words and delivery time of each minute.
+    Partial shared by the throughput metrics, so the processor keeps a single one per minute for all of them.
+    '''
+    invertible = True
+    # Minutes in the window, to turn the totals into rates
+    window_size = 1
+
+    def __init__(self) -> None:
+        self.events = 0
+        self.words = 0
+        self.duration = 0.0
+
+    def add(self, event) -> None:
+        self.events += 1
+        self.words += event.nr_words
+        self.duration += event.duration
+
+    def merge(self, other: "Totals") -> None:
+        self.events += other.events
+        self.words += other.words
+        self.duration += other.duration
+
+    def evict(self, other: "Totals") -> None:
+        self.events -= other.events
+        self.words -= other.words
+        # Reset the sum of an empty window, so rounding errors don't accumulate
+        self.duration = self.duration - other.duration if self.events else 0.0
+
+    @classmethod
+    def summarize(cls, partial: "Totals") -> float:
+        raise NotImplementedError("Subclasses must implement summarize method")
+
+    def result(self) -> float:
+        return self.summarize(self)
+
+
+@register_metric("events_per_minute")
+class EventsPerMinute(Totals):
+    '''
+    Calculates the number of events per minute in the window
+    '''
+    output_field = "events_per_minute"
+    partial = Totals
+
+    @classmethod
+    def summarize(cls, partial: Totals) -> float:
+        return partial.events / (partial.span or cls.window_size)
+
+
+@register_metric("words_per_minute")
+class WordsPerMinute(Totals):
+    '''
+    Calculates the number of translated words per minute in the window
+    '''
+    output_field = "words_per_minute"
+    partial = Totals
+
+    @classmethod
+    def summarize(cls, partial: Totals) -> float:
+        return partial.words / (partial.span or cls.window_size)
+
+
+@register_metric("ms_per_word")
+class DeliveryTimePerWord(Totals):
+    '''
+    Calculates the delivery time per word of the events, weighted by their number of words
+    '''
+    output_field = "delivery_time_per_word"
+    partial = Totals
+
+    @classmethod
+    def summarize(cls, partial: Totals) -> float:
+        if not partial.words:
+            return 0
+        return partial.duration / partial.words
+
+
+@register_metric("slowest")
+class Slowest(IncrementalMetric):
+    '''
+    Lists the top_k slowest translations of the window, with their ids and clients.
+    Each partial keeps only its top_k in a min-heap, so merging two partials costs O(K log K).
+    '''
+    output_field = "slowest_translations"
+    numeric_only = False
+    # Number of translations listed
+    top_k = 5
+
+    def __init__(self) -> None:
+        # Min-heap of (duration, translation_id, client_name), the fastest of the top on top
+        self.heap: List[Tuple[float, str, str]] = []
+
+    def push(self, item: Tuple[float, str, str]) -> None:
+        if len(self.heap) < self.top_k:
+            heapq.heappush(self.heap, item)
+        elif item > self.heap[0]:
+            heapq.heapreplace(self.heap, item)
+
+    def add(self, event) -> None:
+        self.push((event.duration, event.translation_id, event.client_name))
+
+    def merge(self, other: "Slowest") -> None:
+        for item in other.heap:
+            self.push(item)
+
+    def copy(self) -> "Slowest":
+        partial = type(self)()
+        partial.heap = list(self.heap)
+        return partial
+
+    def result(self) -> List[Dict[str, Any]]:
+        return [
+            {"translation_id": translation_id, "client_name": client_name, "duration": duration}
+            for duration, translation_id, client_name in sorted(self.heap, reverse=True)
+        ]
+
+
+class DistinctCount(IncrementalMetric):
+    '''
+    Estimates the number of distinct values of the event fields in the window, with a HyperLogLog sketch per minute.
+    The sketch has a fixed size whatever the number of events, and the estimate has a relative standard error of 1.6%.
+    '''
+    # Fields of the events whose distinct values are counted
+    fields: Tuple[str, ...] = ()
+    numeric_only = False
+
+    def __init__(self) -> None:
+        from hll import HyperLogLog
+        self.sketch = HyperLogLog()
+
+    def add(self, event) -> None:
+        self.sketch.add("\x1f".join(str(getattr(event, field)) for field in self.fields).encode())
+
+    def merge(self, other: "DistinctCount") -> None:
+        self.sketch.merge(other.sketch)
+
+    def copy(self) -> "DistinctCount":
+        partial = type(self)()
+        partial.sketch = self.sketch.copy()
+        return partial
+
+    def result(self) -> int:
+        return round(self.sketch.estimate())
+
+
+@register_metric("distinct_clients")
+class DistinctClients(DistinctCount):
+    '''
+    Estimates the number of distinct clients in the window
+    '''
+    output_field = "distinct_clients"
+    fields = ("client_name",)
+
+
+@register_metric("distinct_language_pairs")
+class DistinctLanguagePairs(DistinctCount):
+    '''
+    Estimates the number of distinct source and target language pairs in the window
+    '''
+    output_field = "distinct_language_pairs"
+    fields = ("source_language", "target_language")
@@ -1,6 +1,11 @@
 import pytest
+import random
+import importlib.metadata
 from types import SimpleNamespace
-from metrics_ import Metrics, MovingAverage, Maximum
+import metrics_
+from datetime import datetime, timedelta
+from metrics_ import (Metrics, IncrementalMetric, MovingAverage, Maximum, ExponentialMovingAverage, Totals,
+                      EventsPerMinute, WordsPerMinute, DeliveryTimePerWord, Slowest, register_metric, get_metric, configure_metric)
 
 @pytest.mark.parametrize(
     "events, expected_ma",
@@ -73,4 +78,204 @@ def test_metrics_base_class():
     
     # The base class compute method should raise NotImplementedError when called directly
     with pytest.raises(NotImplementedError, match="Subclasses must implement compute method"):
-        metrics.compute()
\ No newline at end of file
+        metrics.compute()
+
+def test_incremental_partials_merge_and_evict():
+    """
+    Test that merging partials gives the same result as adding every event,
+    and that evicting the oldest partial removes its events
+    """
+    older, newer = MovingAverage(), MovingAverage()
+    for duration in [10, 20]:
+        older.add(SimpleNamespace(duration=duration))
+    newer.add(SimpleNamespace(duration=60))
+
+    older.merge(newer)
+    assert older.result() == 30
+
+    oldest = MovingAverage()
+    oldest.add(SimpleNamespace(duration=10))
+    oldest.add(SimpleNamespace(duration=20))
+    older.evict(oldest)
+    assert older.result() == 60
+
+    maximum, other = Maximum(), Maximum()
+    maximum.add(SimpleNamespace(duration=5))
+    other.add(SimpleNamespace(duration=7))
+    copy = maximum.copy()
+    maximum.merge(other)
+    assert (maximum.result(), copy.result()) == (7, 5)
+
+
+def test_register_metric(monkeypatch):
+    """
+    Test that registered metrics are selectable by name and must follow the protocol
+    """
+    monkeypatch.setattr(metrics_, "available_metrics", dict(metrics_.available_metrics))
+
+    @register_metric("count")
+    class Count(IncrementalMetric):
+        output_field = "count"
+
+    assert get_metric("count") is Count
+
+    with pytest.raises(TypeError, match="must be a subclass of IncrementalMetric"):
+        register_metric("plain")(object)
+
+
+@pytest.mark.parametrize("by_group", [False, True], ids=["select", "python_before_3_10"])
+def test_load_metric_plugins(monkeypatch, by_group):
+    """
+    Test that the metrics of the entry points are registered only when a metric isn't built in,
+    also with the dict of entry points by group of Python < 3.10
+    """
+    class Plugin(IncrementalMetric):
+        output_field = "plugin"
+
+    entry_point = SimpleNamespace(name="plugin", load=lambda: Plugin)
+    groups = []
+
+    def entry_points(**params):
+        if by_group:
+            if params:
+                raise TypeError("entry_points() got an unexpected keyword argument 'group'")
+            groups.append(metrics_.METRIC_ENTRY_POINT_GROUP)
+            return {metrics_.METRIC_ENTRY_POINT_GROUP: [entry_point], "other": []}
+        groups.append(params["group"])
+        return [entry_point]
+
+    monkeypatch.setattr(metrics_, "available_metrics", dict(metrics_.available_metrics))
+    monkeypatch.setattr(metrics_, "plugins_loaded", False)
+    monkeypatch.setattr(importlib.metadata, "entry_points", entry_points)
+
+    assert get_metric("maximum") is Maximum
+    assert groups == []
+
+    assert get_metric("plugin") is Plugin
+    with pytest.raises(ValueError, match="Unsupported metric"):
+        get_metric("unknown")
+    assert groups == [metrics_.METRIC_ENTRY_POINT_GROUP]
+
+
+@pytest.mark.parametrize(
+    "offsets, durations, expected",
+    [
+        ([], [], 0),
+        ([0], [10], 10),
+        # The older event weighs half after one half life
+        ([0, 5], [10, 20], pytest.approx((0.5 * 10 + 20) / 1.5)),
+        # Order of arrival doesn't matter, only the timestamps
+        ([5, 0], [20, 10], pytest.approx((0.5 * 10 + 20) / 1.5)),
+        # After a long gap the old events are almost forgotten
+        ([0, 500], [10, 20], pytest.approx(20)),
+    ],
+    ids=["empty", "single_event", "one_half_life", "late_event", "long_gap"]
+)
+def test_ewma(offsets, durations, expected):
+    """
+    Test the ewma with a half life of 5 minutes
+    """
+    base = datetime(2025, 4, 20, 12, 0)
+    events = [SimpleNamespace(timestamp=base + timedelta(minutes=offset), duration=duration)
+              for offset, duration in zip(offsets, durations)]
+    assert ExponentialMovingAverage().compute(events) == expected
+
+
+def test_ewma_merge_matches_add():
+    """
+    Test that merging the partials of each minute decays the gaps like adding every event
+    """
+    base = datetime(2025, 4, 20, 12, 0)
+    events = [SimpleNamespace(timestamp=base + timedelta(minutes=minute, seconds=10), duration=minute + 1)
+              for minute in [0, 1, 2, 40, 41, 300]]
+
+    aggregate = ExponentialMovingAverage()
+    for event in events:
+        partial = ExponentialMovingAverage()
+        partial.add(event)
+        aggregate.merge(partial)
+
+    assert aggregate.result() == pytest.approx(ExponentialMovingAverage().compute(events))
+    assert not ExponentialMovingAverage.windowed
+
+
+def test_configure_metric():
+    """
+    Test that the options declared by the metric override its class attributes, and the others are ignored
+    """
+    ewma = configure_metric(ExponentialMovingAverage, {"half_life": 1, "unknown": 2})
+    assert ewma.half_life == 1 and not hasattr(ewma, "unknown")
+    assert issubclass(ewma, ExponentialMovingAverage)
+    assert configure_metric(MovingAverage, {"half_life": 1}) is MovingAverage
+    assert configure_metric(ExponentialMovingAverage, {"half_life": None}) is ExponentialMovingAverage
+
+
+@pytest.mark.parametrize(
+    "metric, events, expected",
+    [
+        (EventsPerMinute, [], 0),
+        (EventsPerMinute, [SimpleNamespace(nr_words=10, duration=20)] * 6, 2),
+        (WordsPerMinute, [SimpleNamespace(nr_words=words, duration=20) for words in [10, 20, 60]], 30),
+        (DeliveryTimePerWord, [], 0),
+        # Weighted by words: the long translation dominates
+        (DeliveryTimePerWord, [SimpleNamespace(nr_words=10, duration=100), SimpleNamespace(nr_words=90, duration=100)], 2),
+        (DeliveryTimePerWord, [SimpleNamespace(nr_words=0, duration=100)], 0),
+    ],
+    ids=[
+        "events_empty",
+        "events_per_minute",
+        "words_per_minute",
+        "per_word_empty",
+        "per_word_weighted",
+        "per_word_without_words",
+    ]
+)
+def test_throughput_metrics(metric, events, expected):
+    """
+    Test the metrics over the totals of a window of three minutes
+    """
+    assert configure_metric(metric, {"window_size": 3})().compute(events) == expected
+
+
+def test_throughput_metrics_share_totals():
+    """
+    Test that the throughput metrics are computed from the same partial class
+    """
+    totals = Totals()
+    totals.add(SimpleNamespace(nr_words=30, duration=60))
+    assert {EventsPerMinute.partial, WordsPerMinute.partial, DeliveryTimePerWord.partial} == {Totals}
+    assert (EventsPerMinute.summarize(totals), WordsPerMinute.summarize(totals), DeliveryTimePerWord.summarize(totals)) == (1, 30, 2)
+
+
+def test_slowest_matches_sort():
+    """
+    Test that merging the top k of several partials gives the top k of all the events
+    """
+    rng = random.Random(3)
+    events = [SimpleNamespace(duration=rng.randint(1, 50), translation_id=f"t{i}", client_name=f"c{i % 4}")
+              for i in range(100)]
+    slowest = configure_metric(Slowest, {"top_k": 3})
+
+    aggregate = slowest()
+    for start in range(0, 100, 7):
+        partial = slowest()
+        for event in events[start:start + 7]:
+            partial.add(event)
+        aggregate.merge(partial)
+
+    expected = sorted(events, key=lambda e: (e.duration, e.translation_id, e.client_name), reverse=True)[:3]
+    assert aggregate.result() == [
+        {"translation_id": e.translation_id, "client_name": e.client_name, "duration": e.duration} for e in expected
+    ]
+    assert slowest().result() == []
+
+
+def test_slowest_copy_is_independent():
+    """
+    Test that the copy of a partial doesn't change with the original
+    """
+    partial = Slowest()
+    partial.add(SimpleNamespace(duration=5, translation_id="a", client_name="x"))
+    copy = partial.copy()
+    partial.add(SimpleNamespace(duration=9, translation_id="b", client_name="y"))
+    assert [item["translation_id"] for item in copy.result()] == ["a"]
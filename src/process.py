@@ -1,9 +1,17 @@
-from metrics_ import Metrics, MovingAverage, Maximum
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Union, Optional, Any, Deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Type, Union
 from collections import deque
 from values import Event, EventResult
-from metrics_ import available_metrics
+from metrics_ import IncrementalMetric, available_metrics, configure_metric, get_metric
+from window import MovingWindow, RollupWindow
+from dedup import Deduplicator
+
+# Policies for events that arrive after their minute was already emitted
+late_event_policies = ("include", "drop")
+
+# Default emission step
+ONE_MINUTE = timedelta(minutes=1)
 
 
 def round_up_minute(dt: datetime) -> datetime:
@@ -11,6 +19,23 @@ def round_up_minute(dt: datetime) -> datetime:
     Return the timestamp up rounded to minute
     '''
     return dt.replace(second=0, microsecond=0)+timedelta(minutes=1)
+
+
+def round_up(dt: datetime, step: timedelta) -> datetime:
+    '''
+    Return the end of the step of the timestamp, steps are aligned to the start of the day
+    '''
+    if step == ONE_MINUTE:
+        return round_up_minute(dt)
+    midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight + (dt - midnight) // step * step + step
+
+
+def format_result(metric: Type[IncrementalMetric], minute: datetime, value: float) -> Dict[str, Any]:
+    '''
+    Format the value of the metric for the minute
+    '''
+    return EventResult(date=minute, delivery_time_op=value).format(metric.output_field)
     
 
 class Processor:
@@ -18,73 +43,140 @@ class Processor:
     Class to process the metrics with data and time window
     '''
     
-    def __init__(self, window_size: int, metric:str) -> None:
-        self.window_size: int = window_size
-        self.moving_window: Deque[Event] = deque()
+    def __init__(self, window_size: float, metric:str, grace_period: float = 0, late_events: str = "include",
+                 dedup: bool = False, metric_options: Optional[Dict[str, Any]] = None, step: float = 60,
+                 history: int = 60, rollups: bool = False) -> None:
+        self.window_size: float = window_size
+        self.window = timedelta(minutes=window_size)
+        # Outputs are emitted, and events bucketed, every step seconds
+        self.step = timedelta(seconds=step)
+        if step <= 0 or timedelta(days=1) % self.step:
+            raise ValueError("The step must be a positive divisor of a day")
+        # The window is evicted step by step, it can't end in the middle of a step
+        if self.window % self.step:
+            raise ValueError("The window must be a whole number of steps")
         self.event_current_minute: Optional[datetime] = None
         self.supported_metrics = available_metrics.keys()
+        # Settings of the metrics, like the half life of the ewma, and the window size for the rates
+        self.metric_options: Dict[str, Any] = dict(metric_options or {}, window_size=window_size)
         
-        if metric not in self.supported_metrics:
-            raise ValueError("Unsupported metric")
-
         self.metric_name = metric
-        self.metric: Metrics = self.get_metrics(metric)
-        
+        self.metric: IncrementalMetric = self.get_metrics(metric)
+        self.metrics: Dict[str, Type[IncrementalMetric]] = {metric: type(self.metric)}
+
+        if late_events not in late_event_policies:
+            raise ValueError("Unsupported late events policy")
+
+        # Seconds to wait after the end of a minute before emitting it on the wall clock
+        self.grace_period = timedelta(seconds=grace_period)
+        self.late_events = late_events
+        self.late_events_count = 0
+
+        # Latest event timestamp, and the same timestamp with the monotonic time when a poll first saw it,
+        # the timer advances the event time from there, whatever the timezone of the host
+        self.latest_event: Optional[datetime] = None
+        self.clock_event: Optional[datetime] = None
+        self.clock_start = 0.0
+
+        # Replayed events are recognized by their translation_id and event_name
+        self.deduplicator: Optional[Deduplicator] = Deduplicator() if dedup else None
+
+        # Partial aggregates of each minute in the window, rolled up into hours and days for the long windows
+        self.rollups = rollups
+        self.moving_window = self.create_moving_window()
+
+        # Last outputs, for the queries of the control socket
+        self.recent_results: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.events_count = 0
         
-    def get_metrics(self, metric: str) -> Metrics:
+    def get_metrics(self, metric: str) -> IncrementalMetric:
         """Select the metric to be used"""
-        if metric in self.supported_metrics:
-            return available_metrics[metric]()
-        else:
-            raise ValueError("Unsupported metric")
+        return configure_metric(get_metric(metric), self.metric_options)()
+
+    def create_moving_window(self) -> MovingWindow:
+        '''
+        Create the moving window of the metrics
+        '''
+        if self.rollups:
+            return RollupWindow(self.metrics, self.window, self.step)
+        return MovingWindow(self.metrics)
         
         
     def popleft_moving_window(self, current_minute: datetime) -> None:
         '''
-        Delete from moving window events out of the time window
+        Delete from moving window the minutes out of the time window
         '''
-        to_popleft: datetime = current_minute - timedelta(minutes=self.window_size)
-        while self.moving_window and self.moving_window[0].timestamp < to_popleft:
-            self.moving_window.popleft()
+        to_popleft: datetime = current_minute - self.window
+        self.moving_window.evict(to_popleft)
+
+        if self.deduplicator is not None:
+            self.deduplicator.expire(to_popleft)
     
     def generate_output_for_minute(self, minute: datetime) -> Dict[str, Any]:
         '''
         Generate output for a specific minute
         '''
-        if self.metric_name not in self.supported_metrics:
-            raise ValueError("Unsupported metric")  
-    
+        self.moving_window.seal(minute)
         self.popleft_moving_window(minute)
-        result = self.metric.compute(self.moving_window)
-        event_result = EventResult(date=minute, delivery_time_op=result)
-        
-        return (
-        event_result.format_moving_average()
-        if self.metric_name == "moving_average"
-        else event_result.format_maximum()
-        )
+        output = self.format_outputs(minute, self.moving_window.result)
+        self.recent_results.append(output)
+        return output
+
+    def current_output(self) -> Optional[Dict[str, Any]]:
+        '''
+        Output of the events of the minute still open, as if it ended now
+        '''
+        if self.event_current_minute is None:
+            return None
+        return self.format_outputs(self.event_current_minute, self.moving_window.open_result)
+
+    def format_outputs(self, minute: datetime, result: Callable[[str], Any]) -> Dict[str, Any]:
+        '''
+        Format the result of the metric for the minute
+        '''
+        return self.format_output(minute, result(self.metric_name))
+
+    def format_output(self, minute: datetime, value: float) -> Dict[str, Any]:
+        '''
+        Format the value of the metric for the minute
+        '''
+        return format_result(self.metrics[self.metric_name], minute, value)
         
     def process(self, event: Event) -> Optional[Union[Dict[str, Any], List[Dict[str, Any]]]]:
         '''
         Process events and generate outputs for every minute
         '''
+        self.events_count += 1
+        if self.latest_event is None or event.timestamp > self.latest_event:
+            self.latest_event = event.timestamp
+
+        # Skip the events already processed
+        if self.deduplicator is not None and self.deduplicator.is_duplicate(
+            (event.translation_id, event.event_name), round_up(event.timestamp, self.step)
+        ):
+            return None
                 
         # Initialize the current minute if this is the first event
         if self.event_current_minute is None:
-            self.event_current_minute = round_up_minute(event.timestamp)
-            self.moving_window.append(event)
-            event_result = EventResult(date=self.event_current_minute-timedelta(minutes=1), delivery_time_op=0)
-            return (
-                event_result.format_moving_average()
-                if self.metric_name == "moving_average"
-                else event_result.format_maximum()
-            )
+            self.event_current_minute = round_up(event.timestamp, self.step)
+            # Output of the empty window before the first event
+            output = self.generate_output_for_minute(self.event_current_minute-self.step)
+            self.moving_window.add(self.event_current_minute, event)
+            return output
         # Get the minute of the current event
-        event_minute = round_up_minute(event.timestamp)
+        event_minute = round_up(event.timestamp, self.step)
         
         # If the event is in the same minute as current_minute, just add it to the window
         if event_minute == self.event_current_minute:
-            self.moving_window.append(event)
+            self.moving_window.add(event_minute, event)
+            return None
+
+        # The minute of the event was already emitted
+        if event_minute < self.event_current_minute:
+            self.late_events_count += 1
+            if self.late_events == "include":
+                # Counted in the minutes still to be emitted
+                self.moving_window.add(self.event_current_minute, event)
             return None
             
         # The event is in a future minute, generate outputs for all minutes in between
@@ -93,20 +185,70 @@ class Processor:
             output: Dict[str, Any] = self.generate_output_for_minute(self.event_current_minute)
             outputs.append(output)
             # Move to next minute
-            self.event_current_minute += timedelta(minutes=1)
+            self.event_current_minute += self.step
         
         # Add the current event to the window
-        self.moving_window.append(event)
+        self.moving_window.add(event_minute, event)
         
         # Return the outputs (could be multiple if there were gaps)
         if not outputs:
             return None
         return outputs[0] if len(outputs) == 1 else outputs
     
+    def event_clock(self) -> datetime:
+        '''
+        Current event time: the latest event timestamp, plus the wall time elapsed since it was first seen.
+        The host clock and timezone are never compared with the timestamps, so naive timestamps in
+        any timezone, or a backlog of old events, don't close minutes that didn't happen yet.
+        '''
+        elapsed = time.monotonic()
+        if self.latest_event != self.clock_event:
+            self.clock_event = self.latest_event
+            self.clock_start = elapsed
+        return self.clock_event + timedelta(seconds=elapsed - self.clock_start)
+
+    def close_elapsed_minutes(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        '''
+        Generate outputs for the minutes that ended more than the grace period ago on the event clock,
+        without waiting for a later event
+        '''
+        if self.event_current_minute is None:
+            return []
+
+        if now is None:
+            now = self.event_clock()
+
+        outputs: List[Dict[str, Any]] = []
+        while self.event_current_minute + self.grace_period <= now:
+            outputs.append(self.generate_output_for_minute(self.event_current_minute))
+            self.event_current_minute += self.step
+        return outputs
+
     def finalize(self) -> Optional[Dict[str, Any]]:
         '''
         Generate final output for the last minute processed
         '''
         if self.event_current_minute:
             return self.generate_output_for_minute(self.event_current_minute)
-        return None
\ No newline at end of file
+        return None
+
+
+class MultiMetricProcessor(Processor):
+    '''
+    Processor computing several metrics over the same moving window.
+    The outputs map each metric name to its formatted result.
+    '''
+
+    def __init__(self, window_size: float, metrics: List[str], **options: Any) -> None:
+        if not metrics:
+            raise ValueError("At least one metric is required")
+
+        super().__init__(window_size, metrics[0], **options)
+        self.metrics = {metric: configure_metric(get_metric(metric), self.metric_options) for metric in metrics}
+        self.moving_window = self.create_moving_window()
+
+    def format_outputs(self, minute: datetime, result: Callable[[str], Any]) -> Dict[str, Dict[str, Any]]:
+        '''
+        Format the result of every metric for the minute
+        '''
+        return {name: format_result(metric, minute, result(name)) for name, metric in self.metrics.items()}
@@ -1,11 +1,12 @@
+import time
 import pytest
-from process import Processor, round_up_minute
-from datetime import datetime, timedelta
+from process import Processor, MultiMetricProcessor, round_up_minute, round_up
+from datetime import datetime, timedelta, timezone
 from types import SimpleNamespace
 from unittest.mock import Mock, patch
 from metrics_ import MovingAverage, Maximum
 from values import Event
-from collections import deque
+from window import MovingWindow
 
 @pytest.fixture
 def mock_event():
@@ -148,7 +149,7 @@ def test_process_return_logic():
     # Test case 1: First event initializes current_minute and returns output
     # Before the first event, event_current_minute should be None
     processor.event_current_minute = None
-    processor.moving_window = deque()
+    processor.moving_window = MovingWindow(processor.metrics)
     
     first_event = Event(
         timestamp=initial_time - timedelta(seconds=30),  # Just before initial_time
@@ -279,4 +280,350 @@ def test_process_increments_current_minute():
     # Assert that current_minute was incremented to match the event's minute
     # The current_minute will be incremented to round_up_minute(future_time)
     expected_new_minute = round_up_minute(future_time)
-    assert processor.event_current_minute == expected_new_minute
\ No newline at end of file
+    assert processor.event_current_minute == expected_new_minute
+
+def test_close_elapsed_minutes_after_grace(mock_event):
+    """
+    Test that minutes are emitted on the wall clock once the grace period is over
+    """
+    p = Processor(window_size=10, metric="maximum", grace_period=5)
+    p.process(mock_event(datetime(2025, 4, 20, 12, 0, 30), 10))
+
+    # The minute ends at 12:01:00, still inside the grace period
+    assert p.close_elapsed_minutes(datetime(2025, 4, 20, 12, 1, 4)) == []
+
+    outputs = p.close_elapsed_minutes(datetime(2025, 4, 20, 12, 3, 5))
+    assert outputs == [
+        {"date": "2025-04-20 12:01:00", "max_delivery_time": 10},
+        {"date": "2025-04-20 12:02:00", "max_delivery_time": 10},
+        {"date": "2025-04-20 12:03:00", "max_delivery_time": 10},
+    ]
+    assert p.event_current_minute == datetime(2025, 4, 20, 12, 4)
+
+
+def test_close_elapsed_minutes_without_events():
+    """
+    Test that nothing is emitted before the first event
+    """
+    p = Processor(window_size=10, metric="maximum", grace_period=5)
+    assert p.close_elapsed_minutes() == []
+
+
+@pytest.mark.parametrize(
+    "late_events, expected_max",
+    [
+        ("include", 50),
+        ("drop", 10),
+    ]
+)
+def test_late_events_policy(mock_event, late_events, expected_max):
+    """
+    Test the handling of an event whose minute was already emitted by the timer
+    """
+    p = Processor(window_size=10, metric="maximum", grace_period=5, late_events=late_events)
+    p.process(mock_event(datetime(2025, 4, 20, 12, 0, 30), 10))
+    p.close_elapsed_minutes(datetime(2025, 4, 20, 12, 1, 10))
+
+    result = p.process(mock_event(datetime(2025, 4, 20, 12, 0, 50), 50))
+    assert result is None
+    assert p.late_events_count == 1
+    assert p.finalize()["max_delivery_time"] == expected_max
+
+
+@pytest.mark.parametrize(
+    "window_size, step",
+    [(30 / 60, 60), (25 / 60, 10)],
+    ids=["shorter_than_step", "not_multiple_of_step"]
+)
+def test_window_not_whole_number_of_steps(window_size, step):
+    """
+    Test that a window that would be rounded up to whole steps raises ValueError
+    """
+    with pytest.raises(ValueError, match="The window must be a whole number of steps"):
+        Processor(window_size=window_size, metric="maximum", step=step)
+
+
+def test_unsupported_late_events_policy():
+    """
+    Test that an unsupported late events policy raises ValueError
+    """
+    with pytest.raises(ValueError, match="Unsupported late events policy"):
+        Processor(window_size=5, metric="maximum", late_events="unknown")
+
+
+def test_dedup_skips_replayed_events():
+    """
+    Test that replayed events are only counted once while in the window
+    """
+    def event(ts, translation_id, duration):
+        return SimpleNamespace(timestamp=ts, duration=duration, translation_id=translation_id,
+                               event_name="translation_delivered")
+
+    p = Processor(window_size=2, metric="moving_average", dedup=True)
+    base = datetime(2025, 4, 20, 12, 0, 10)
+    p.process(event(base, "a", 10))
+    p.process(event(base + timedelta(seconds=5), "b", 20))
+    assert p.process(event(base + timedelta(seconds=10), "a", 10)) is None
+
+    result = p.process(event(base + timedelta(minutes=1), "c", 30))
+    assert result == {"date": "2025-04-20 12:01:00", "average_delivery_time": 15}
+    assert p.deduplicator.duplicates_count == 1
+
+    # Out of the window horizon, the id is forgotten
+    p.process(event(base + timedelta(minutes=5), "d", 40))
+    assert "a" not in [key[0] for key in p.deduplicator.seen]
+
+
+def test_multi_metric_processor(mock_event):
+    """
+    Test that several metrics are computed over the same moving window
+    """
+    p = MultiMetricProcessor(window_size=10, metrics=["moving_average", "maximum"])
+    base = datetime(2025, 4, 20, 12, 0, 30)
+
+    assert p.process(mock_event(base, 10)) == {
+        "moving_average": {"date": "2025-04-20 12:00:00", "average_delivery_time": 0.0},
+        "maximum": {"date": "2025-04-20 12:00:00", "max_delivery_time": 0.0},
+    }
+    p.process(mock_event(base + timedelta(seconds=10), 30))
+    assert p.process(mock_event(base + timedelta(minutes=1), 20)) == {
+        "moving_average": {"date": "2025-04-20 12:01:00", "average_delivery_time": 20},
+        "maximum": {"date": "2025-04-20 12:01:00", "max_delivery_time": 30},
+    }
+
+
+def test_multi_metric_processor_without_metrics():
+    """
+    Test that at least one metric is required
+    """
+    with pytest.raises(ValueError, match="At least one metric is required"):
+        MultiMetricProcessor(window_size=10, metrics=[])
+
+
+def test_processor_drives_registered_metric(mock_event, monkeypatch):
+    """
+    Test that any registered metric is computed and formatted with its own output field
+    """
+    import metrics_
+    monkeypatch.setattr(metrics_, "available_metrics", dict(metrics_.available_metrics))
+
+    @metrics_.register_metric("minimum")
+    class Minimum(metrics_.Maximum):
+        output_field = "min_delivery_time"
+
+        def add(self, event):
+            if self.value is None or event.duration < self.value:
+                self.value = event.duration
+
+        def merge(self, other):
+            if other.value is not None and (self.value is None or other.value < self.value):
+                self.value = other.value
+
+    p = Processor(window_size=2, metric="minimum")
+    base = datetime(2025, 4, 20, 12, 0, 30)
+    p.process(mock_event(base, 20))
+    p.process(mock_event(base + timedelta(seconds=10), 10))
+    assert p.process(mock_event(base + timedelta(minutes=1), 30)) == {"date": "2025-04-20 12:01:00", "min_delivery_time": 10}
+    assert p.process(mock_event(base + timedelta(minutes=3), 40)) == [
+        {"date": "2025-04-20 12:02:00", "min_delivery_time": 10},
+        {"date": "2025-04-20 12:03:00", "min_delivery_time": 30},
+    ]
+
+
+def test_processor_ewma_is_not_evicted():
+    """
+    Test that the ewma keeps the events out of the window, with the configured half life
+    """
+    def event(ts, duration):
+        return SimpleNamespace(timestamp=ts, duration=duration)
+
+    p = Processor(window_size=1, metric="ewma", metric_options={"half_life": 1})
+    base = datetime(2025, 4, 20, 12, 0, 0)
+    p.process(event(base, 10))
+    assert p.process(event(base + timedelta(minutes=1), 40)) == {"date": "2025-04-20 12:01:00", "ewma_delivery_time": 10}
+    # The minutes out of the window of one minute are still weighted
+    assert p.process(event(base + timedelta(minutes=5), 0)) == [
+        {"date": "2025-04-20 12:02:00", "ewma_delivery_time": pytest.approx((0.5 * 10 + 40) / 1.5)},
+        {"date": "2025-04-20 12:03:00", "ewma_delivery_time": pytest.approx((0.5 * 10 + 40) / 1.5)},
+        {"date": "2025-04-20 12:04:00", "ewma_delivery_time": pytest.approx((0.5 * 10 + 40) / 1.5)},
+        {"date": "2025-04-20 12:05:00", "ewma_delivery_time": pytest.approx((0.5 * 10 + 40) / 1.5)},
+    ]
+
+
+def test_multi_metric_processor_throughput():
+    """
+    Test the throughput metrics over the window, as rates per minute of the window size
+    """
+    def event(ts, nr_words, duration):
+        return SimpleNamespace(timestamp=ts, nr_words=nr_words, duration=duration)
+
+    p = MultiMetricProcessor(window_size=2, metrics=["events_per_minute", "words_per_minute", "ms_per_word"])
+    base = datetime(2025, 4, 20, 12, 0, 30)
+    p.process(event(base, 10, 50))
+    p.process(event(base + timedelta(seconds=10), 30, 30))
+    p.process(event(base + timedelta(minutes=1), 20, 100))
+    assert p.process(event(base + timedelta(minutes=2), 20, 100)) == {
+        "events_per_minute": {"date": "2025-04-20 12:02:00", "events_per_minute": 1.5},
+        "words_per_minute": {"date": "2025-04-20 12:02:00", "words_per_minute": 30},
+        "ms_per_word": {"date": "2025-04-20 12:02:00", "delivery_time_per_word": 3},
+    }
+    # The first minute left the window
+    assert p.finalize()["events_per_minute"]["events_per_minute"] == 1
+
+
+@pytest.mark.parametrize(
+    "timestamp, step, expected",
+    [
+        (datetime(2025, 4, 20, 12, 34, 21), timedelta(seconds=10), datetime(2025, 4, 20, 12, 34, 30)),
+        (datetime(2025, 4, 20, 12, 34, 20), timedelta(seconds=10), datetime(2025, 4, 20, 12, 34, 30)),
+        (datetime(2025, 4, 20, 23, 59, 55), timedelta(seconds=10), datetime(2025, 4, 21, 0, 0)),
+        (datetime(2025, 4, 20, 12, 34, 21), timedelta(minutes=15), datetime(2025, 4, 20, 12, 45)),
+        (datetime(2025, 4, 20, 12, 34, 21), timedelta(minutes=1), datetime(2025, 4, 20, 12, 35)),
+    ],
+    ids=["seconds", "on_the_boundary", "end_of_day", "quarter_hour", "minute"]
+)
+def test_round_up(timestamp, step, expected):
+    """
+    Test the rounding up to the end of the step
+    """
+    assert round_up(timestamp, step) == expected
+
+
+def test_processor_sub_minute_step(mock_event):
+    """
+    Test a window of 30 seconds emitted every 10 seconds
+    """
+    p = Processor(window_size=0.5, metric="maximum", step=10)
+    base = datetime(2025, 4, 20, 12, 0, 1)
+    assert p.process(mock_event(base, 50)) == {"date": "2025-04-20 12:00:00", "max_delivery_time": 0.0}
+    assert p.process(mock_event(base + timedelta(seconds=12), 20)) == {"date": "2025-04-20 12:00:10", "max_delivery_time": 50}
+    assert p.process(mock_event(base + timedelta(seconds=45), 10)) == [
+        {"date": "2025-04-20 12:00:20", "max_delivery_time": 50},
+        {"date": "2025-04-20 12:00:30", "max_delivery_time": 50},
+        # The first event left the window of 30 seconds
+        {"date": "2025-04-20 12:00:40", "max_delivery_time": 20},
+    ]
+    # Only the buckets of the window are kept
+    assert list(p.moving_window.minutes) == [datetime(2025, 4, 20, 12, 0, 20)]
+
+
+@pytest.mark.parametrize("step", [0, -10, 7], ids=["zero", "negative", "not_divisor_of_a_day"])
+def test_processor_invalid_step(step):
+    """
+    Test that the step must be positive and divide a day
+    """
+    with pytest.raises(ValueError, match="The step must be a positive divisor of a day"):
+        Processor(window_size=5, metric="maximum", step=step)
+
+
+def test_processor_slowest_translations():
+    """
+    Test that the slowest translations leave the list when their minute leaves the window
+    """
+    def event(ts, translation_id, duration):
+        return SimpleNamespace(timestamp=ts, translation_id=translation_id, client_name="client", duration=duration)
+
+    p = Processor(window_size=2, metric="slowest", metric_options={"top_k": 2})
+    base = datetime(2025, 4, 20, 12, 0, 30)
+    assert p.process(event(base, "a", 30)) == {"date": "2025-04-20 12:00:00", "slowest_translations": []}
+    p.process(event(base + timedelta(seconds=5), "b", 10))
+    p.process(event(base + timedelta(seconds=10), "c", 20))
+    p.process(event(base + timedelta(minutes=1), "d", 5))
+    result = p.process(event(base + timedelta(minutes=2), "e", 1))
+    assert result["slowest_translations"] == [
+        {"translation_id": "a", "client_name": "client", "duration": 30},
+        {"translation_id": "c", "client_name": "client", "duration": 20},
+    ]
+    result = p.process(event(base + timedelta(minutes=3), "f", 1))
+    assert [item["translation_id"] for item in result["slowest_translations"]] == ["d", "e"]
+
+
+def test_processor_distinct_counts():
+    """
+    Test the distinct clients and language pairs of the window against the exact counts
+    """
+    def event(ts, client_name, source_language, target_language):
+        return SimpleNamespace(timestamp=ts, client_name=client_name, source_language=source_language,
+                               target_language=target_language, duration=1)
+
+    p = MultiMetricProcessor(window_size=2, metrics=["distinct_clients", "distinct_language_pairs"])
+    base = datetime(2025, 4, 20, 12, 0, 0)
+    minutes = [
+        [("a", "en", "fr"), ("b", "en", "fr"), ("a", "en", "de")],
+        [("c", "fr", "en"), ("a", "en", "fr")],
+        [("d", "en", "pt")],
+    ]
+    outputs = []
+    for minute, events in enumerate(minutes):
+        for i, fields in enumerate(events):
+            outputs.append(p.process(event(base + timedelta(minutes=minute, seconds=i), *fields)))
+    outputs.append(p.finalize())
+    outputs = [output for output in outputs if output]
+
+    for output, window in zip(outputs[1:], [minutes[0], minutes[0] + minutes[1], minutes[1] + minutes[2]]):
+        assert output["distinct_clients"]["distinct_clients"] == len({fields[0] for fields in window})
+        assert output["distinct_language_pairs"]["distinct_language_pairs"] == len({fields[1:] for fields in window})
+
+
+def test_recent_results_ring_buffer(mock_event):
+    """
+    Test that only the last outputs are kept, and the open minute can be read before it is emitted
+    """
+    p = Processor(window_size=10, metric="maximum", history=2)
+    base = datetime(2025, 4, 20, 12, 0, 30)
+    assert p.current_output() is None
+
+    for minute in range(4):
+        p.process(mock_event(base + timedelta(minutes=minute), minute))
+
+    assert [result["date"] for result in p.recent_results] == ["2025-04-20 12:02:00", "2025-04-20 12:03:00"]
+    assert p.current_output() == {"date": "2025-04-20 12:04:00", "max_delivery_time": 3}
+    assert p.events_count == 4
+
+
+def test_processor_rollups(mock_event):
+    """
+    Test that the rolled up window keeps few partials, gives the same result for the metrics over the
+    whole stream, and only differs at the oldest edge for the windowed metrics
+    """
+    outputs = {}
+    for rollups in (False, True):
+        p = MultiMetricProcessor(window_size=2 * 24 * 60, metrics=["ewma", "maximum"], rollups=rollups)
+        base = datetime(2025, 4, 20, 12, 0, 30)
+        for i in range(4 * 24 * 6):
+            p.process(mock_event(base + timedelta(minutes=10 * i), i % 500))
+        outputs[rollups] = p.finalize()
+        lengths = len(p.moving_window)
+
+    # The 6 steps of the current hour and the hours of the last two days, instead of 288 steps
+    assert lengths <= 6 + 2 * 24 + 1
+    assert outputs[True]["ewma"] == outputs[False]["ewma"]
+    assert outputs[True]["maximum"]["max_delivery_time"] >= outputs[False]["maximum"]["max_delivery_time"]
+
+
+@pytest.mark.skipif(not hasattr(time, "tzset"), reason="time.tzset is not available on this platform")
+def test_close_elapsed_minutes_ignores_host_timezone(mock_event, monkeypatch):
+    """
+    Test that the timer advances from the latest event by the elapsed time, with naive UTC events
+    on a host in another timezone and an old event
+    """
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time.tzset()
+    try:
+        clock = [1000.0]
+        monkeypatch.setattr("process.time.monotonic", lambda: clock[0])
+        for timestamp in (datetime.now(timezone.utc).replace(tzinfo=None), datetime(2018, 12, 26, 18, 11, 8)):
+            p = Processor(window_size=10, metric="maximum", grace_period=1)
+            p.process(mock_event(timestamp, 10))
+            current_minute = p.event_current_minute
+
+            # Nothing elapsed since the event
+            assert p.close_elapsed_minutes() == []
+
+            clock[0] += 61
+            outputs = p.close_elapsed_minutes()
+            assert [output["date"] for output in outputs] == [str(current_minute)]
+            assert p.event_current_minute == current_minute + timedelta(minutes=1)
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()
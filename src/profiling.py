@@ -0,0 +1,101 @@
+import sys
+import signal
+import cProfile
+import threading
+import tracemalloc
+from typing import IO, Any, Optional
+
+# Number of allocation sites in each memory report
+TOP_ALLOCATIONS = 10
+
+
+class Profiler:
+    '''
+    CPU profile of the run with cProfile, written as a pstats file (python -m pstats, snakeviz, ...).
+    In live mode, SIGUSR1 toggles the profiling: it stops the profile and writes it, and the next one
+    starts a new profile, so a slow period can be captured without restarting. Each capture
+    overwrites the file.
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.profile: Optional[cProfile.Profile] = None
+
+    @property
+    def running(self) -> bool:
+        return self.profile is not None
+
+    def start(self) -> None:
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self) -> None:
+        '''
+        Stop the profiling and write the profile, if it is running
+        '''
+        if self.profile is None:
+            return
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+        self.profile = None
+        print(f"Profile written to {self.path}", file=sys.stderr)
+
+    def toggle(self, signum: Any = None, frame: Any = None) -> None:
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def install_toggle(self) -> None:
+        '''
+        Toggle the profiling on SIGUSR1
+        '''
+        signal.signal(signal.SIGUSR1, self.toggle)
+
+
+class MemoryTracer:
+    '''
+    Trace the memory allocations with tracemalloc, reporting the top allocation sites every interval
+    seconds and at the end of the run. Tracing slows down the allocations, so it is only for diagnosis.
+    '''
+
+    def __init__(self, interval: float, top: int = TOP_ALLOCATIONS, output: Optional[IO[str]] = None) -> None:
+        self.interval = interval
+        self.top = top
+        # Standard error by default, looked up on each report
+        self.output = output
+        self.reports = 0
+        tracemalloc.start()
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.report()
+
+    def report(self) -> None:
+        '''
+        Write the allocation sites holding the most memory, ignoring the allocations of tracemalloc itself
+        '''
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+        self.reports += 1
+        output = self.output or sys.stderr
+        print(f"Memory report {self.reports}: {current / 1024:.1f} KiB traced, {peak / 1024:.1f} KiB peak", file=output)
+        for stat in snapshot.statistics("lineno")[:self.top]:
+            print(f"  {stat}", file=output)
+        output.flush()
+
+    def close(self) -> None:
+        '''
+        Stop the periodic reports and write the final one
+        '''
+        self.stopped.set()
+        self.thread.join()
+        self.report()
+        tracemalloc.stop()
@@ -0,0 +1,68 @@
+import io
+import os
+import time
+import pstats
+import signal
+import pytest
+from profiling import Profiler, MemoryTracer
+
+
+def busy_function():
+    return sum(i * i for i in range(10000))
+
+
+def test_profiler_writes_pstats(tmp_path, capsys):
+    """
+    Test that the profile is written when the profiler stops, and only if it was running
+    """
+    path = tmp_path / "run.pstats"
+    profiler = Profiler(str(path))
+    profiler.stop()
+    assert not path.exists()
+
+    profiler.start()
+    busy_function()
+    profiler.stop()
+
+    functions = [function for _, _, function in pstats.Stats(str(path)).stats]
+    assert "busy_function" in functions
+    assert not profiler.running
+    assert f"Profile written to {path}" in capsys.readouterr().err
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="SIGUSR1 is not available on this platform")
+def test_profiler_toggled_by_signal(tmp_path):
+    """
+    Test that SIGUSR1 stops the profile and writes it, and the next one starts a new profile
+    """
+    path = tmp_path / "live.pstats"
+    profiler = Profiler(str(path))
+    previous = signal.getsignal(signal.SIGUSR1)
+    try:
+        profiler.install_toggle()
+        profiler.start()
+        os.kill(os.getpid(), signal.SIGUSR1)
+        assert not profiler.running and path.exists()
+
+        os.kill(os.getpid(), signal.SIGUSR1)
+        assert profiler.running
+        profiler.stop()
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+
+
+def test_memory_tracer_reports_allocation_sites():
+    """
+    Test that the reports list the allocation sites, periodically and at the end
+    """
+    output = io.StringIO()
+    tracer = MemoryTracer(0.05, top=3, output=output)
+    blocks = [bytearray(1024) for _ in range(2000)]
+    time.sleep(0.2)
+    tracer.close()
+
+    reports = output.getvalue()
+    assert tracer.reports >= 2
+    assert reports.count("Memory report") == tracer.reports
+    assert "profiling_test.py" in reports
+    assert len(blocks) == 2000
@@ -1,75 +1,267 @@
+import os
 import json
 import sys
-import os
 import time
-from typing import Generator, Optional
+import heapq
+from collections import Counter
+from typing import Any, BinaryIO, Callable, Generator, IO, Iterable, List, Optional, Tuple, Union
 from values import Event
+from streams import detect_compression, is_stream, open_input, read_lines
+
+# Size of the buffer of the dead-letter file
+DEAD_LETTER_BUFFER_SIZE = 1 << 16
+
+
+def file_identity(status: os.stat_result) -> Tuple[int, int]:
+    '''
+    Device and inode of a file, which change when the path is replaced by a new file
+    '''
+    return status.st_dev, status.st_ino
+
+
+class InvalidEventError(ValueError):
+    '''
+    Error raised when a line can't be parsed into an event, with the reason of the failure
+    '''
+
+    def __init__(self, reason: str, message: str) -> None:
+        super().__init__(message)
+        self.reason = reason
+
+
+class BadLines:
+    '''
+    Class to keep track of the lines that could not be parsed.
+    Counts them by reason and optionally writes them to a dead-letter file.
+    '''
+
+    def __init__(self, dead_letter_file: Optional[str] = None, max_bad_lines: Optional[int] = None) -> None:
+        self.dead_letter_file = dead_letter_file
+        self.max_bad_lines = max_bad_lines
+        self.counts: Counter = Counter()
+        self.total = 0
+        self.output: Optional[IO[str]] = None
+
+    def record(self, filename: str, position: int, line: bytes, error: InvalidEventError) -> None:
+        '''
+        Record a bad line found at the byte offset position of the file
+        '''
+        self.counts[error.reason] += 1
+        self.total += 1
+
+        if self.dead_letter_file is not None:
+            if self.output is None:
+                self.output = open(self.dead_letter_file, 'a', buffering=DEAD_LETTER_BUFFER_SIZE)
+            json.dump({
+                "file": filename,
+                "offset": position,
+                "reason": error.reason,
+                "error": str(error),
+                "line": line.decode(errors='replace')
+            }, self.output)
+            self.output.write("\n")
+
+        if self.max_bad_lines is not None and self.total > self.max_bad_lines:
+            self.close()
+            print(f"Too many invalid lines, more than {self.max_bad_lines}", file=sys.stderr)
+            sys.exit(1)
+
+    def summary(self) -> str:
+        '''
+        Summary of the bad lines by reason
+        '''
+        reasons = ", ".join(f"{reason}={count}" for reason, count in sorted(self.counts.items()))
+        return f"{self.total} ({reasons})"
+
+    def close(self) -> None:
+        '''
+        Flush and close the dead-letter file
+        '''
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+
 
 class Reader:
     '''
     Class to read the events from the file
     '''
     
-    def __init__(self, filename: str, keep_reading_live: bool = False) -> None:
+    def __init__(self, filename: str, keep_reading_live: bool = False, bad_lines: Optional[BadLines] = None,
+                 validate: bool = False, event_name: Optional[str] = None, parser_pool: Optional[Any] = None) -> None:
         self.filename = filename  
         self.keep_reading_live = keep_reading_live  
         self.last_position = 0  
+        self.compressed = False
+        self.stream = False
+        self.bad_lines = bad_lines if bad_lines is not None else BadLines()
+        self.validate = validate
+        # Only the events with this name are parsed, the other lines are rejected from their bytes
+        self.event_name = event_name
+        # Names that JSON may escape, like non ASCII ones written as \uXXXX, have no single encoding to look for,
+        # so their lines are all decoded
+        self.event_name_pattern: Optional[bytes] = None
+        if event_name is not None and event_name.isascii() and json.dumps(event_name) == f'"{event_name}"':
+            self.event_name_pattern = f'"{event_name}"'.encode()
+        self.filtered_count = 0
+        # Pool of parser processes (workers.ParserPool), the lines are parsed in this process otherwise
+        self.parser_pool = parser_pool
+        # File tailed in live mode, kept open so it can be drained after being rotated
+        self.live_file: Optional[BinaryIO] = None
+        self.identity: Optional[Tuple[int, int]] = None
+        self.rotations_count = 0
+        self.truncations_count = 0
          
-    def parse_event(self, line: str) -> Event:
+    def parse_event(self, line: Union[str, bytes]) -> Event:
         '''
         Parse the event from the line
         '''
         # Parse JSON line
         try:
             event_data = json.loads(line)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Invalid JSON format: {e}")
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise InvalidEventError("invalid_json", f"Invalid JSON format: {e}")
            
         try:
-            
-            event = Event(
-                timestamp = event_data['timestamp'],
-                translation_id = event_data['translation_id'],
-                source_language = event_data['source_language'],
-                target_language = event_data['target_language'],
-                client_name = event_data['client_name'],
-                event_name = event_data['event_name'],
-                nr_words = event_data['nr_words'],
-                duration = event_data['duration']
-            )
-        
-            return event
+            if self.validate:
+                # pydantic is only imported when the validation is requested
+                from validation import validate_event
+                return validate_event(event_data)
+            return Event.from_dict(event_data)
         except KeyError as e:
-            raise ValueError(f"Missing key in JSON data: {e}")                
+            raise InvalidEventError("missing_key", f"Missing key in JSON data: {e}")
+        except (TypeError, ValueError) as e:
+            raise InvalidEventError("invalid_value", f"Invalid value in JSON data: {e}")
     
     def read_existing_events(self) -> Generator[Event, None, None]:
         """
         Read only events that already exist in the file.
         """
         try:
-            with open(self.filename, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:  # Skip empty lines
-                        continue
-                    
-                    try:
-                        event = self.parse_event(line)
-                        yield event
-                    except (json.JSONDecodeError, ValueError, KeyError):
-                        print(f"Error decoding JSON: {line}")
-            
-            # Store the current file position for live monitoring
-            if self.keep_reading_live:
-                self.last_position = os.path.getsize(self.filename)
+            self.stream = is_stream(self.filename)
+            self.compressed = not self.stream and detect_compression(self.filename) is not None
+            # When monitoring live, a last line without newline may still be being written
+            final = not self.keep_reading_live or self.compressed or self.stream
+            self.last_position = 0
+            f = open_input(self.filename)
+            try:
+                yield from self.decode_lines(self.track_positions(read_lines(f, final=final)))
+            finally:
+                if final:
+                    f.close()
+                else:
+                    # Tailed from here, even if the path is rotated in the meantime
+                    self.live_file = f
+                    self.identity = file_identity(os.fstat(f.fileno()))
         
         except FileNotFoundError:
             print(f"File not found: {self.filename}")
             sys.exit(1)
     
-    def monitor_live_events(self) -> Optional[Generator[Event, None, None]]:
+    def read_new_events(self) -> Generator[Event, None, None]:
+        """
+        Read the events appended since the last position, without waiting for more.
+        The backlog is read in large chunks, and a line is only consumed once complete.
+        Compressed files are archives, they are not expected to grow, and streams can't be read again.
+        The file stays open between polls: when the path is rotated to a new file, the old one is drained
+        to its end before switching, and when it is truncated it is read again from the start.
+        """
+        if self.compressed or self.stream:
+            return
+
+        if self.live_file is None:
+            self.live_file = open(self.filename, 'rb')
+            identity = file_identity(os.fstat(self.live_file.fileno()))
+            if self.identity is not None and identity != self.identity:
+                # Rotated since the existing events were read
+                self.rotations_count += 1
+                self.last_position = 0
+            self.identity = identity
+        elif os.fstat(self.live_file.fileno()).st_size < self.last_position:
+            # Truncated in place, like logrotate copytruncate
+            self.truncations_count += 1
+            self.last_position = 0
+
+        yield from self.read_live_file(final=False)
+
+        try:
+            identity = file_identity(os.stat(self.filename))
+        except FileNotFoundError:
+            # Renamed and not created again yet, keep reading the old file
+            return
+        if identity != self.identity:
+            # Lines written to the old file until now, the last one won't be completed
+            yield from self.read_live_file(final=True)
+            self.live_file.close()
+            self.live_file = None
+            self.identity = None
+            self.rotations_count += 1
+            self.last_position = 0
+            yield from self.read_new_events()
+
+    def read_live_file(self, final: bool) -> Generator[Event, None, None]:
+        '''
+        Read the events of the live file from the last position
+        '''
+        self.live_file.seek(self.last_position)
+        yield from self.decode_lines(self.track_positions(read_lines(self.live_file, self.last_position, final=final)))
+
+    def decode_line(self, line: bytes, position: int) -> Optional[Event]:
+        """
+        Parse a raw line starting at the byte offset position, returning None for empty or invalid lines
+        """
+        try:
+            return self.parse_line(line)
+        except InvalidEventError as e:
+            self.bad_lines.record(self.filename, position, line.strip(), e)  # Skip bad JSON
+            return None
+
+    def parse_line(self, line: bytes) -> Optional[Event]:
+        """
+        Parse a raw line, returning None for empty lines and the lines of other events
+        """
+        line = line.strip()
+        if not line:  # Skip empty lines
+            return None
+
+        # Cheap check before decoding, the name must appear in the line as a JSON string
+        if self.event_name_pattern is not None and self.event_name_pattern not in line:
+            self.filtered_count += 1
+            return None
+
+        event = self.parse_event(line)
+
+        # The name may have been found in another field
+        if self.event_name is not None and event.event_name != self.event_name:
+            self.filtered_count += 1
+            return None
+        return event
+
+    def decode_lines(self, lines: Iterable[Tuple[bytes, int]]) -> Generator[Event, None, None]:
+        """
+        Parse the lines with their byte offsets, in the parser processes when there is a pool
+        """
+        if self.parser_pool is not None:
+            yield from self.parser_pool.decode(lines, self)
+            return
+
+        for line, position in lines:
+            event = self.decode_line(line, position)
+            if event is not None:
+                yield event
+
+    def track_positions(self, lines: Iterable[Tuple[bytes, int]]) -> Generator[Tuple[bytes, int], None, None]:
+        """
+        Store the exact position consumed for live monitoring, yielding each line with its start offset
+        """
+        for line, position in lines:
+            start, self.last_position = self.last_position, position
+            yield line, start
+
+    def monitor_live_events(self, on_poll: Optional[Callable[[], None]] = None) -> Optional[Generator[Event, None, None]]:
         """
         Monitor the file for new events after reading existing ones.
+        on_poll is called after each poll of the file, even when there are no new events.
         """
         if not self.keep_reading_live: 
             return None
@@ -77,31 +269,78 @@ class Reader:
         try:
             while True:
                 try:
-                    with open(self.filename, 'r') as file:
-                        file.seek(self.last_position)
-
-                        line = file.readline()
-                        if line:
-                            line = line.strip()
-                            if not line:  # Skip empty lines
-                                continue
-
-                            try:
-                                event = self.parse_event(line)
-                                # Update position before yielding
-                                self.last_position = file.tell()
-                                yield event
-                            except (json.JSONDecodeError, ValueError, KeyError):
-                                print(f"Error decoding JSON: {line}")
-                                self.last_position = file.tell()  # Skip bad JSON
-                                
-                        else:
-                            # No new line, pause before retrying
-                            time.sleep(0.5)
+                    new_events = False
+                    for event in self.read_new_events():
+                        new_events = True
+                        yield event
+
+                    if on_poll is not None:
+                        on_poll()
+
+                    if not new_events:
+                        # No new line, pause before retrying
+                        time.sleep(0.5)
                 except FileNotFoundError:
                     print(f"File not found: {self.filename}")
                     time.sleep(1)  # Wait and retry if file monitoring
 
         except Exception as e:
             print(f"Error monitoring file: {e}")
-            sys.exit(1)
\ No newline at end of file
+            sys.exit(1)
+
+
+class MergedReader:
+    '''
+    Class to read the events from several files as a single stream ordered by timestamp
+    '''
+
+    def __init__(self, filenames: Iterable[str], keep_reading_live: bool = False, bad_lines: Optional[BadLines] = None,
+                 validate: bool = False, event_name: Optional[str] = None) -> None:
+        self.bad_lines = bad_lines if bad_lines is not None else BadLines()
+        self.readers: List[Reader] = [
+            Reader(filename, keep_reading_live, self.bad_lines, validate, event_name) for filename in filenames
+        ]
+        self.keep_reading_live = keep_reading_live
+
+    def read_existing_events(self) -> Generator[Event, None, None]:
+        """
+        K-way merge of the events already in the files.
+        Each file is expected to be ordered, so only one event per file is kept in memory.
+        """
+        yield from heapq.merge(
+            *(reader.read_existing_events() for reader in self.readers),
+            key=lambda event: event.timestamp
+        )
+
+    def monitor_live_events(self, on_poll: Optional[Callable[[], None]] = None) -> Optional[Generator[Event, None, None]]:
+        """
+        Tail all the files, merging the events appended to each of them by timestamp.
+        on_poll is called after each poll of the files, even when there are no new events.
+        """
+        if not self.keep_reading_live:
+            return None
+
+        try:
+            while True:
+                batches: List[List[Event]] = []
+                for reader in self.readers:
+                    try:
+                        batches.append(list(reader.read_new_events()))
+                    except FileNotFoundError:
+                        print(f"File not found: {reader.filename}")
+
+                new_events = False
+                for event in heapq.merge(*batches, key=lambda event: event.timestamp):
+                    new_events = True
+                    yield event
+
+                if on_poll is not None:
+                    on_poll()
+
+                if not new_events:
+                    # No new line in any file, pause before retrying
+                    time.sleep(0.5)
+
+        except Exception as e:
+            print(f"Error monitoring file: {e}")
+            sys.exit(1)
@@ -1,10 +1,12 @@
 import os
 import time
 import json
+import gzip
 import pytest
 import inspect
-from read import Reader
-from datetime import datetime
+import threading
+from read import Reader, MergedReader, BadLines, InvalidEventError
+from datetime import datetime, timezone
 from values import Event
 
 @pytest.mark.parametrize(
@@ -242,8 +244,10 @@ def test_monitor_handles_bad_json(tmp_path, monkeypatch, capsys):
     with pytest.raises(SystemExit):
         next(reader.monitor_live_events())
 
+    # Bad lines are counted, not printed with the results
     captured = capsys.readouterr()
-    assert "Error decoding JSON" in captured.out
+    assert captured.out == ""
+    assert reader.bad_lines.counts == {"invalid_json": 1}
 
 
 def test_monitor_handles_missing_file(monkeypatch, capsys):
@@ -283,4 +287,362 @@ def test_monitor_catches_generic_exception(monkeypatch, capsys):
 
     captured = capsys.readouterr()
     assert "Error monitoring file" in captured.out
-    assert exc.value.code == 1
\ No newline at end of file
+    assert exc.value.code == 1
+
+def make_event_line(timestamp, translation_id):
+    data = make_event_dict()
+    data["timestamp"] = timestamp
+    data["translation_id"] = translation_id
+    return json.dumps(data)
+
+def test_merged_reader_orders_events(tmp_path):
+    """
+    Test that events from several files are merged by timestamp
+    """
+    file_a = tmp_path / "host_a.log"
+    file_b = tmp_path / "host_b.log"
+    file_a.write_text("\n".join([
+        make_event_line("2025-04-21 10:00:00", "a1"),
+        make_event_line("2025-04-21 10:02:00", "a2"),
+        make_event_line("2025-04-21 10:05:00", "a3"),
+    ]) + "\n")
+    file_b.write_text("\n".join([
+        make_event_line("2025-04-21 10:01:00", "b1"),
+        "{bad json}",
+        make_event_line("2025-04-21 10:03:00", "b2"),
+    ]) + "\n")
+
+    reader = MergedReader([str(file_a), str(file_b)], keep_reading_live=False)
+    events = list(reader.read_existing_events())
+
+    assert [e.translation_id for e in events] == ["a1", "b1", "a2", "b2", "a3"]
+
+def test_merged_reader_not_live():
+    """
+    When keep_reading_live is False, the merged monitor stops immediately
+    """
+    reader = MergedReader(["a.log", "b.log"], False)
+    with pytest.raises(StopIteration):
+        next(reader.monitor_live_events())
+
+def test_merged_reader_tails_all_files(tmp_path, monkeypatch, capsys):
+    """
+    Test that live monitoring picks new events from every file, ordered by timestamp
+    """
+    file_a = tmp_path / "host_a.log"
+    file_b = tmp_path / "host_b.log"
+    file_a.write_text(make_event_line("2025-04-21 10:00:00", "a1") + "\n")
+    file_b.write_text("")
+    file_c = tmp_path / "host_c.log"
+    file_c.write_text("")
+
+    reader = MergedReader([str(file_a), str(file_b), str(file_c)], keep_reading_live=True)
+    assert [e.translation_id for e in reader.read_existing_events()] == ["a1"]
+
+    # A file that disappears must not stop the other files from being tailed
+    file_c.unlink()
+
+    with open(file_a, "a") as f:
+        f.write(make_event_line("2025-04-21 10:03:00", "a2") + "\n")
+    with open(file_b, "a") as f:
+        f.write(make_event_line("2025-04-21 10:01:00", "b1") + "\n")
+
+    monkeypatch.setattr(time, "sleep", lambda _: (_ for _ in ()).throw(SystemExit()))
+
+    gen = reader.monitor_live_events()
+    assert [next(gen).translation_id, next(gen).translation_id] == ["b1", "a2"]
+    with pytest.raises(SystemExit):
+        next(gen)
+
+    # The removed file is still open from the backfill, it is drained like a rotated file
+    captured = capsys.readouterr()
+    assert "Error monitoring file" not in captured.out
+
+def test_read_existing_events_compressed(tmp_path, monkeypatch):
+    """
+    Test that compressed files are read as plain ones and are not tailed
+    """
+    file = tmp_path / "events.json.gz"
+    lines = [make_event_line("2025-04-21 10:00:00", "a1"), make_event_line("2025-04-21 10:01:00", "a2")]
+    file.write_bytes(gzip.compress(("\n".join(lines) + "\n").encode()))
+
+    reader = Reader(str(file), keep_reading_live=True)
+    events = list(reader.read_existing_events())
+
+    assert [e.translation_id for e in events] == ["a1", "a2"]
+    assert reader.compressed
+    assert list(reader.read_new_events()) == []
+
+def test_monitor_live_events_calls_on_poll(tmp_path, monkeypatch):
+    """
+    Test that on_poll is called after each poll, even without new events
+    """
+    file = tmp_path / "live.log"
+    file.write_text("")
+    reader = Reader(str(file), keep_reading_live=True)
+
+    polls = []
+    monkeypatch.setattr(time, "sleep", lambda _: (_ for _ in ()).throw(SystemExit()))
+
+    with pytest.raises(SystemExit):
+        next(reader.monitor_live_events(on_poll=lambda: polls.append(True)))
+    assert polls == [True]
+
+def test_backfill_hands_exact_offset_to_live(tmp_path, monkeypatch):
+    """
+    Test that a line still being written at the end of the backfill is read once complete by the live monitor
+    """
+    file = tmp_path / "live.log"
+    complete = make_event_line("2025-04-21 10:00:00", "a1") + "\n"
+    partial = make_event_line("2025-04-21 10:01:00", "a2")
+    file.write_text(complete + partial[:20])
+
+    reader = Reader(str(file), keep_reading_live=True)
+    events = list(reader.read_existing_events())
+    assert [e.translation_id for e in events] == ["a1"]
+    assert reader.last_position == len(complete)
+
+    # The writer finishes the line and appends a backlog of events
+    backlog = [make_event_line(f"2025-04-21 10:{m:02d}:00", f"b{m}") for m in range(2, 50)]
+    with open(file, "a") as f:
+        f.write(partial[20:] + "\n" + "\n".join(backlog) + "\n")
+
+    monkeypatch.setattr(time, "sleep", lambda _: (_ for _ in ()).throw(SystemExit()))
+
+    live = []
+    with pytest.raises(SystemExit):
+        for event in reader.monitor_live_events():
+            live.append(event.translation_id)
+
+    assert live == ["a2"] + [f"b{m}" for m in range(2, 50)]
+    assert reader.last_position == os.path.getsize(str(file))
+
+@pytest.mark.parametrize(
+    "line, reason",
+    [
+        ("{bad json}", "invalid_json"),
+        (json.dumps({"timestamp": "2025-04-21 10:00:00"}), "missing_key"),
+        (json.dumps(dict(make_event_dict(), duration=-1)), "invalid_value"),
+        (b"\xff\xfe", "invalid_json"),
+    ],
+    ids=[
+        "invalid_json",
+        "missing_key",
+        "negative_duration",
+        "invalid_utf8"
+    ]
+)
+def test_parse_event_error_reason(line, reason):
+    """
+    Test that parse_event errors carry the reason of the failure
+    """
+    reader = Reader("dummy", False)
+    with pytest.raises(InvalidEventError) as exc:
+        reader.parse_event(line)
+    assert exc.value.reason == reason
+
+def test_bad_lines_dead_letter_file(tmp_path, capsys):
+    """
+    Test that bad lines are written to the dead-letter file with their byte offset and reason
+    """
+    file = tmp_path / "events.log"
+    good = json.dumps(make_event_dict())
+    bad_key = json.dumps({"timestamp": "2025-04-21 10:00:00"})
+    file.write_text("\n".join([good, "{bad json}", good, bad_key]) + "\n")
+    dead_letter = tmp_path / "dead_letter.json"
+
+    bad_lines = BadLines(str(dead_letter))
+    reader = Reader(str(file), keep_reading_live=False, bad_lines=bad_lines)
+    assert len(list(reader.read_existing_events())) == 2
+    bad_lines.close()
+
+    entries = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert [(e["offset"], e["reason"], e["line"]) for e in entries] == [
+        (len(good) + 1, "invalid_json", "{bad json}"),
+        (2 * len(good) + len("{bad json}") + 3, "missing_key", bad_key),
+    ]
+    assert bad_lines.summary() == "2 (invalid_json=1, missing_key=1)"
+    assert capsys.readouterr().out == ""
+
+def test_bad_lines_fail_fast(tmp_path, capsys):
+    """
+    Test that reading stops once the number of bad lines is over the threshold
+    """
+    file = tmp_path / "events.log"
+    file.write_text("{bad}\n" * 3 + json.dumps(make_event_dict()) + "\n")
+
+    reader = Reader(str(file), keep_reading_live=False, bad_lines=BadLines(max_bad_lines=2))
+    with pytest.raises(SystemExit) as exc:
+        list(reader.read_existing_events())
+
+    assert exc.value.code == 1
+    assert "Too many invalid lines, more than 2" in capsys.readouterr().err
+    assert reader.bad_lines.counts == {"invalid_json": 3}
+
+def test_read_existing_events_named_pipe(tmp_path):
+    """
+    Test that events are read from a named pipe until the writer closes it
+    """
+    fifo = tmp_path / "events.fifo"
+    os.mkfifo(fifo)
+    lines = [make_event_line(f"2025-04-21 10:{m:02d}:00", f"a{m}") for m in range(10)]
+
+    def produce():
+        with open(fifo, "w") as f:
+            for line in lines:
+                f.write(line + "\n")
+                f.flush()
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    reader = Reader(str(fifo), keep_reading_live=True)
+    events = list(reader.read_existing_events())
+    producer.join()
+
+    assert [e.translation_id for e in events] == [f"a{m}" for m in range(10)]
+    assert reader.stream
+    assert list(reader.read_new_events()) == []
+
+@pytest.mark.parametrize("validate", [False, True], ids=["fast", "validated"])
+def test_parse_event_validation_modes(validate):
+    """
+    Test that the fast and the validated parsing produce the same events
+    """
+    reader = Reader("dummy", False, validate=validate)
+    event = reader.parse_event(json.dumps(dict(make_event_dict(), timestamp="2025-04-21T10:00:00Z")))
+
+    assert isinstance(event, Event)
+    assert event.timestamp == datetime(2025, 4, 21, 10, 0, tzinfo=timezone.utc)
+    assert event.duration == 1.23
+    assert event.nr_words == 100
+
+
+@pytest.mark.parametrize("validate", [False, True], ids=["fast", "validated"])
+@pytest.mark.parametrize(
+    "timestamp, expected",
+    [
+        (1545847868.5, datetime(2018, 12, 26, 18, 11, 8, 500000, tzinfo=timezone.utc)),
+        (1545847868, datetime(2018, 12, 26, 18, 11, 8, tzinfo=timezone.utc)),
+        ("1545847868", datetime(2018, 12, 26, 18, 11, 8, tzinfo=timezone.utc)),
+        (1545847868500, datetime(2018, 12, 26, 18, 11, 8, 500000, tzinfo=timezone.utc)),
+        ("2018-12-26 18:11:08.5", datetime(2018, 12, 26, 18, 11, 8, 500000)),
+        ("2018-12-26T18:11:08.1234567", datetime(2018, 12, 26, 18, 11, 8, 123456)),
+    ],
+    ids=["epoch_float", "epoch_int", "epoch_string", "epoch_milliseconds", "one_digit_fraction", "long_fraction"]
+)
+def test_parse_event_timestamps(validate, timestamp, expected):
+    """
+    Test that the fast parsing accepts the same timestamps as the pydantic model
+    """
+    reader = Reader("dummy", False, validate=validate)
+    event = reader.parse_event(json.dumps(dict(make_event_dict(), timestamp=timestamp)))
+
+    assert event.timestamp == expected
+
+
+@pytest.mark.parametrize("validate", [False, True], ids=["fast", "validated"])
+@pytest.mark.parametrize(
+    "nr_words, expected",
+    [(3.0, 3), ("3", 3), (3.7, None), ("many", None)],
+    ids=["whole_float", "string", "fraction", "not_a_number"]
+)
+def test_parse_event_nr_words(validate, nr_words, expected):
+    """
+    Test that the fast parsing rejects the numbers of words the pydantic model rejects, instead of truncating them
+    """
+    reader = Reader("dummy", False, validate=validate)
+    data = dict(make_event_dict(), nr_words=nr_words)
+    if expected is None:
+        with pytest.raises(InvalidEventError):
+            reader.parse_event(json.dumps(data))
+    else:
+        assert reader.parse_event(json.dumps(data)).nr_words == expected
+
+
+def test_event_name_filter(tmp_path, monkeypatch):
+    """
+    Test that the lines of other events are skipped before being decoded, and the name is confirmed after
+    """
+    lines = [
+        dict(make_event_dict(), event_name="translation_delivered", translation_id="kept"),
+        dict(make_event_dict(), event_name="translation_requested"),
+        # The name appears in another field
+        dict(make_event_dict(), client_name="translation_delivered"),
+    ]
+    path = tmp_path / "events.json"
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n{not json but other event}\n")
+
+    decoded = []
+    reader = Reader(str(path), event_name="translation_delivered")
+    parse_event = reader.parse_event
+    monkeypatch.setattr(reader, "parse_event", lambda line: decoded.append(line) or parse_event(line))
+
+    events = list(reader.read_existing_events())
+
+    assert [event.translation_id for event in events] == ["kept"]
+    assert len(decoded) == 2
+    assert reader.filtered_count == 3
+    assert reader.bad_lines.total == 0
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False], ids=["escaped", "raw"])
+def test_event_name_filter_non_ascii(tmp_path, ensure_ascii):
+    """
+    Test that a non ASCII name is found whether the producer escaped it or not
+    """
+    lines = [
+        dict(make_event_dict(), event_name="traducción_entregada", translation_id="kept"),
+        dict(make_event_dict(), event_name="translation_requested"),
+    ]
+    path = tmp_path / "events.json"
+    path.write_text("\n".join(json.dumps(line, ensure_ascii=ensure_ascii) for line in lines) + "\n", encoding="utf-8")
+
+    reader = Reader(str(path), event_name="traducción_entregada")
+    events = list(reader.read_existing_events())
+
+    assert [event.translation_id for event in events] == ["kept"]
+    assert reader.filtered_count == 1
+
+
+def test_live_file_rotated(tmp_path):
+    """
+    Test that the old file is drained to its end before switching to the new file of the path
+    """
+    file = tmp_path / "live.log"
+    file.write_text(make_event_line("2025-04-21 10:00:00", "a1") + "\n")
+    reader = Reader(str(file), keep_reading_live=True)
+    assert [e.translation_id for e in reader.read_existing_events()] == ["a1"]
+
+    # Written before the rotation, but not read yet
+    with open(file, "a") as f:
+        f.write(make_event_line("2025-04-21 10:00:10", "a2") + "\n")
+    os.rename(file, tmp_path / "live.log.1")
+    # Renamed, the path doesn't exist yet
+    assert [e.translation_id for e in reader.read_new_events()] == ["a2"]
+
+    with open(tmp_path / "live.log.1", "a") as f:
+        f.write(make_event_line("2025-04-21 10:00:20", "a3") + "\n")
+    file.write_text(make_event_line("2025-04-21 10:00:30", "b1") + "\n")
+
+    assert [e.translation_id for e in reader.read_new_events()] == ["a3", "b1"]
+    assert reader.rotations_count == 1
+    assert reader.last_position == file.stat().st_size
+
+
+def test_live_file_truncated(tmp_path):
+    """
+    Test that a file truncated in place is read again from the start
+    """
+    file = tmp_path / "live.log"
+    file.write_text("\n".join(make_event_line("2025-04-21 10:00:00", f"a{i}") for i in range(3)) + "\n")
+    reader = Reader(str(file), keep_reading_live=True)
+    assert len(list(reader.read_existing_events())) == 3
+    assert list(reader.read_new_events()) == []
+
+    with open(file, "r+") as f:
+        f.truncate(0)
+        f.write(make_event_line("2025-04-21 10:01:00", "b1") + "\n")
+
+    assert [e.translation_id for e in reader.read_new_events()] == ["b1"]
+    assert reader.truncations_count == 1
+    assert reader.rotations_count == 0
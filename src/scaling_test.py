@@ -0,0 +1,128 @@
+import gc
+import time
+import pytest
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from process import MultiMetricProcessor
+
+# Metrics of each kind of window: invertible, merge only, over the whole stream and shared partials
+METRICS = ["moving_average", "maximum", "ewma", "events_per_minute"]
+
+# Events of each generated stream
+EVENTS = 3000
+
+# Budget of the peak memory of a processor: a fixed part, with the last results kept for the control
+# socket, a part for each minute with events in the window, with the partials of all the metrics,
+# and a part for each output of the longest gap, which are returned together
+MEMORY_BASE = 192 * 1024
+MEMORY_PER_MINUTE = 640
+MEMORY_PER_OUTPUT = 1536
+
+# Maximum growth of the time per event and output, with noise margin for the CI machines
+TIME_GROWTH = 2.5
+
+
+def make_stream(rate, pattern, events=EVENTS, base=datetime(2025, 4, 20, 12, 0, 0)):
+    '''
+    Generate events at the given rate per minute:
+    - steady -> Evenly spaced
+    - bursty -> The events of each 10 minutes in their first minute
+    - gaps -> Evenly spaced, with 6 hours without events after every 1000 events
+    The events are created while they are processed, so the memory of any event kept counts in the peak.
+    '''
+    for i in range(events):
+        offset = timedelta(seconds=60 * i / rate)
+        if pattern == "bursty":
+            period = timedelta(minutes=10)
+            offset = offset // period * period + (offset % period) / 10
+        elif pattern == "gaps":
+            offset += i // 1000 * timedelta(hours=6)
+        yield SimpleNamespace(timestamp=base + offset, duration=i % 97, nr_words=i % 13)
+
+
+def run(processor, stream):
+    '''
+    Process the stream, returning the number of outputs
+    '''
+    outputs = 0
+    for event in stream:
+        output = processor.process(event)
+        if output:
+            outputs += len(output) if isinstance(output, list) else 1
+    return outputs + 1 if processor.finalize() else outputs
+
+
+def peak_memory(processor, stream):
+    '''
+    Peak memory allocated while the processor runs over the stream, in bytes
+    '''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run(processor, stream)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def time_per_item(window_size, stream, repeats=3):
+    '''
+    Best time over the repeats per event and output of a run over the stream, in seconds
+    '''
+    best = None
+    for _ in range(repeats):
+        processor = MultiMetricProcessor(window_size, METRICS)
+        start = time.perf_counter()
+        outputs = run(processor, stream)
+        elapsed = (time.perf_counter() - start) / (len(stream) + outputs)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@pytest.mark.parametrize("pattern", ["steady", "bursty", "gaps"])
+@pytest.mark.parametrize("rate", [0.5, 5, 500], ids=["sparse", "moderate", "dense"])
+@pytest.mark.parametrize("window_size", [10, 1440, 43200], ids=["10m", "1d", "30d"])
+def test_memory_bounded_by_minutes_in_window(window_size, rate, pattern):
+    """
+    Test that the peak memory depends on the minutes with events in the window, never on the number of events
+    """
+    minutes = sorted({event.timestamp.replace(second=0, microsecond=0) for event in make_stream(rate, pattern)})
+    longest_gap = max((later - earlier for earlier, later in zip(minutes, minutes[1:])), default=timedelta(0))
+
+    peak = peak_memory(MultiMetricProcessor(window_size, METRICS), make_stream(rate, pattern))
+
+    assert peak < (MEMORY_BASE + MEMORY_PER_MINUTE * min(window_size, len(minutes))
+                   + MEMORY_PER_OUTPUT * longest_gap // timedelta(minutes=1))
+
+
+def test_memory_bounded_with_rollups():
+    """
+    Test that a window of 30 days over 35 days of events keeps the partials of a few hours and days
+    """
+    processor = MultiMetricProcessor(30 * 24 * 60, METRICS, step=3600, rollups=True)
+
+    peak = peak_memory(processor, make_stream(2 / 60, "steady", events=35 * 48, base=datetime(2025, 4, 1)))
+
+    # The hours of the current day and the days of the window
+    assert len(processor.moving_window) <= 24 + 31
+    assert peak < MEMORY_BASE + MEMORY_PER_MINUTE * (24 + 31)
+
+
+@pytest.mark.parametrize("pattern", ["steady", "gaps"])
+def test_time_independent_of_window_size(pattern):
+    """
+    Test that the time per event and output of a window of 30 days is close to the one of a window of 10 minutes
+    """
+    stream = list(make_stream(1, pattern))
+
+    assert time_per_item(43200, stream) < TIME_GROWTH * time_per_item(10, stream)
+
+
+def test_time_linear_in_events():
+    """
+    Test that 4 times more events take at most around 4 times longer, while the window of a day fills up
+    """
+    stream = list(make_stream(1, "steady", events=4 * 800))
+
+    assert time_per_item(1440, stream) < TIME_GROWTH * time_per_item(1440, stream[:800])
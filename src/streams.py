@@ -0,0 +1,167 @@
+import io
+import os
+import sys
+import stat
+import importlib
+import queue
+import threading
+from typing import IO, Generator, Optional, Tuple, Union
+
+# Size of the chunks read from the input streams
+READ_BUFFER_SIZE = 1 << 20
+
+# Number of decompressed chunks that can be waiting to be parsed
+PREFETCH_DEPTH = 4
+
+# Input file name to read from stdin
+STDIN = "-"
+
+# Magic numbers at the start of the supported compressed formats
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+}
+
+# Modules of the codecs, imported only when a compressed file is opened
+compression_modules = {
+    "gzip": "gzip",
+    "bz2": "bz2",
+    "xz": "lzma",
+}
+
+
+def is_stream(filename: str) -> bool:
+    '''
+    Check if the input is stdin or a named pipe, which can only be read once and can't seek
+    '''
+    if filename == STDIN:
+        return True
+    try:
+        return stat.S_ISFIFO(os.stat(filename).st_mode)
+    except OSError:
+        return False
+
+
+def detect_compression(filename: str) -> Optional[str]:
+    '''
+    Return the compression format of the file from its magic number, or None for plain text
+    '''
+    with open(filename, 'rb') as f:
+        head = f.read(6)
+
+    for magic, compression in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+class PrefetchStream(io.RawIOBase):
+    '''
+    Raw stream that reads chunks from another stream in a background thread.
+    Decompression releases the GIL, so it overlaps with the parsing of the previous chunks.
+    '''
+
+    def __init__(self, stream: IO[bytes], chunk_size: int = READ_BUFFER_SIZE, depth: int = PREFETCH_DEPTH) -> None:
+        super().__init__()
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.chunks: "queue.Queue[Union[bytes, BaseException]]" = queue.Queue(maxsize=depth)
+        self.pending = memoryview(b"")
+        self.eof = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._prefetch, daemon=True)
+        self.thread.start()
+
+    def _prefetch(self) -> None:
+        '''
+        Read chunks until the end of the stream, or until the stream is closed
+        '''
+        try:
+            while not self.stopped.is_set():
+                chunk = self.stream.read(self.chunk_size)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except BaseException as e:
+            self._put(e)
+
+    def _put(self, item: Union[bytes, BaseException]) -> None:
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self.pending:
+            if self.eof:
+                return 0
+            item = self.chunks.get()
+            if isinstance(item, BaseException):
+                self.eof = True
+                raise item
+            if not item:
+                self.eof = True
+                return 0
+            self.pending = memoryview(item)
+
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            self.stream.close()
+        super().close()
+
+
+def open_input(filename: str) -> IO[bytes]:
+    '''
+    Open the input file in binary mode, streaming through the decompressor when the file is compressed.
+    Stdin and named pipes are read as they are.
+    '''
+    if filename == STDIN:
+        # Do not close stdin with the returned stream
+        return open(sys.stdin.fileno(), 'rb', closefd=False)
+    if is_stream(filename):
+        return open(filename, 'rb')
+
+    compression = detect_compression(filename)
+    if compression is None:
+        return open(filename, 'rb')
+
+    codec = importlib.import_module(compression_modules[compression])
+    stream = codec.open(filename, 'rb')
+    return io.BufferedReader(PrefetchStream(stream), READ_BUFFER_SIZE)
+
+
+def read_lines(stream: IO[bytes], position: int = 0, final: bool = True) -> Generator[Tuple[bytes, int], None, None]:
+    '''
+    Split the stream in lines reading it in large chunks.
+    Yields each line with the byte offset right after it, so the caller knows exactly what was consumed.
+    A last line without newline is only yielded when final, otherwise it may still be being written.
+    '''
+    # On pipes, read1 returns what is available instead of waiting for a full chunk
+    read = getattr(stream, "read1", stream.read)
+    pending = b""
+    while True:
+        chunk = read(READ_BUFFER_SIZE)
+        if not chunk:
+            break
+
+        lines = (pending + chunk if pending else chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            position += len(line) + 1
+            yield line, position
+
+    if pending and final:
+        yield pending, position + len(pending)
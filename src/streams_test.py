@@ -0,0 +1,135 @@
+import io
+import os
+import bz2
+import gzip
+import lzma
+import pytest
+from streams import PrefetchStream, detect_compression, is_stream, open_input, read_lines
+
+LINES = [f'{{"line": {i}}}' for i in range(1000)]
+
+@pytest.mark.parametrize(
+    "suffix, compress, expected_compression",
+    [
+        ("json", lambda data: data, None),
+        ("json.gz", gzip.compress, "gzip"),
+        ("json.bz2", bz2.compress, "bz2"),
+        ("json.xz", lzma.compress, "xz"),
+    ],
+    ids=[
+        "plain",
+        "gzip",
+        "bz2",
+        "xz"
+    ]
+)
+def test_open_input(tmp_path, suffix, compress, expected_compression):
+    """
+    Test that compressed files are detected and streamed as text
+    """
+    file_path = tmp_path / f"events.{suffix}"
+    file_path.write_bytes(compress(("\n".join(LINES) + "\n").encode()))
+
+    assert detect_compression(str(file_path)) == expected_compression
+    with open_input(str(file_path)) as f:
+        assert [line.decode() for line, _ in read_lines(f)] == LINES
+
+def test_detect_compression_by_content(tmp_path):
+    """
+    Test that the format is detected from the content and not the extension
+    """
+    file_path = tmp_path / "events.json"
+    file_path.write_bytes(gzip.compress(b"{}\n"))
+    assert detect_compression(str(file_path)) == "gzip"
+
+def test_prefetch_stream_small_chunks():
+    """
+    Test that the prefetch stream returns all the data when chunks are smaller than the reads
+    """
+    data = bytes(range(256)) * 100
+    stream = PrefetchStream(io.BytesIO(data), chunk_size=7, depth=2)
+    assert stream.read() == data
+    assert stream.read() == b""
+    stream.close()
+
+def test_prefetch_stream_propagates_errors(tmp_path):
+    """
+    Test that a decompression error in the background thread is raised to the reader
+    """
+    file_path = tmp_path / "truncated.json.gz"
+    file_path.write_bytes(gzip.compress(("\n".join(LINES)).encode())[:-10])
+
+    with pytest.raises(EOFError):
+        with open_input(str(file_path)) as f:
+            f.read()
+
+def test_prefetch_stream_close_before_end():
+    """
+    Test that closing the stream stops the background thread
+    """
+    stream = PrefetchStream(io.BytesIO(b"x" * 1000), chunk_size=1, depth=1)
+    assert stream.read(1) == b"x"
+    stream.close()
+    assert not stream.thread.is_alive()
+
+@pytest.mark.parametrize(
+    "data, final, expected",
+    [
+        # Every line ends with a newline
+        (b"a\nbb\n", True, [(b"a", 2), (b"bb", 5)]),
+        # Last line without newline is only read when the stream is final
+        (b"a\nbb", True, [(b"a", 2), (b"bb", 4)]),
+        (b"a\nbb", False, [(b"a", 2)]),
+        # Empty lines keep their offset
+        (b"\n\na\n", True, [(b"", 1), (b"", 2), (b"a", 4)]),
+    ],
+    ids=[
+        "complete_lines",
+        "partial_last_line_final",
+        "partial_last_line_not_final",
+        "empty_lines"
+    ]
+)
+def test_read_lines_offsets(data, final, expected):
+    """
+    Test that read_lines yields each line with the byte offset after it
+    """
+    assert list(read_lines(io.BytesIO(data), final=final)) == expected
+
+def test_read_lines_across_chunks(monkeypatch):
+    """
+    Test that lines split between two chunks are joined
+    """
+    monkeypatch.setattr("streams.READ_BUFFER_SIZE", 3)
+    data = b"abcde\nfg\nhijklmn\n"
+    lines = list(read_lines(io.BytesIO(data), position=10))
+    assert lines == [(b"abcde", 16), (b"fg", 19), (b"hijklmn", 27)]
+
+def test_is_stream(tmp_path):
+    """
+    Test that stdin and named pipes are recognized as streams, and regular or missing files are not
+    """
+    fifo = tmp_path / "events.fifo"
+    os.mkfifo(fifo)
+    regular = tmp_path / "events.json"
+    regular.write_text("")
+
+    assert is_stream("-")
+    assert is_stream(str(fifo))
+    assert not is_stream(str(regular))
+    assert not is_stream(str(tmp_path / "missing.json"))
+
+def test_open_input_stdin(monkeypatch):
+    """
+    Test that "-" reads stdin without closing it
+    """
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b"a\nb\n")
+    os.close(write_fd)
+    stdin = os.fdopen(read_fd, "r")
+    monkeypatch.setattr("sys.stdin", stdin)
+
+    with open_input("-") as f:
+        assert list(read_lines(f)) == [(b"a", 2), (b"b", 4)]
+    assert not stdin.closed
+    stdin.close()
@@ -1,10 +1,57 @@
 import argparse
 import sys
 import os
-from read import Reader
-from process import Processor
+import glob
+from datetime import timedelta
+from typing import List
+from read import Reader, MergedReader, BadLines
+from streams import STDIN, is_stream
+from process import Processor, late_event_policies
 from write import Writer      
-from metrics_ import available_metrics 
+from fanout import FanOut, FanOutWriter, load_config
+from metrics_ import available_metrics, get_metric
+
+
+def resolve_input_files(patterns: List[str]) -> List[str]:
+    '''
+    Expand the glob patterns given as input and validate that every file exists.
+    "-" reads from stdin, and named pipes are accepted as files.
+    '''
+    filenames: List[str] = []
+    for pattern in patterns:
+        if pattern == STDIN or is_stream(pattern):
+            if pattern not in filenames:
+                filenames.append(pattern)
+            continue
+
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise FileNotFoundError(f"No file matches the pattern '{pattern}'.")
+
+        for filename in matches:
+            if not os.path.isfile(filename):
+                raise FileNotFoundError(f"The file '{filename}' does not exist.")
+            if filename not in filenames:
+                filenames.append(filename)
+
+    return filenames
+
+
+# Seconds of each duration unit
+duration_units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value: str) -> float:
+    '''
+    Parse a duration like 10s, 5m, 1h or 7d into seconds, numbers without unit are seconds
+    '''
+    unit = value[-1:] if value[-1:] in duration_units else "s"
+    number = value[:-1] if value[-1:] in duration_units else value
+    try:
+        return float(number) * duration_units[unit]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid duration: '{value}' (use for example 10s, 5m or 1h)")
+
 
 def main():
     '''
@@ -13,76 +60,253 @@ def main():
     
     parser = argparse.ArgumentParser(description="Process data from the last X minutes")
     
-    parser.add_argument("--input_file", type=str, required=True, 
-                        help="Input file to process")
-    parser.add_argument("--window_size", type=int, required=True, 
+    parser.add_argument("--input_file", type=str, nargs="+", 
+                        help="Input file(s) or glob pattern(s) to process, merged by timestamp")
+    window = parser.add_mutually_exclusive_group()
+    window.add_argument("--window_size", type=int, 
                         help='Window size to process data in minutes')
-    parser.add_argument("--metric", type=str, default="moving_average", choices=list(available_metrics.keys()), 
-                        help="""Available metrics:\n
+    window.add_argument("--window", type=parse_duration, default=None,
+                        help="Window size as a duration (10s, 5m, 1h), allows windows shorter than a minute")
+    parser.add_argument("--step", type=parse_duration, default=60,
+                        help="Interval between the outputs as a duration (10s, 5m, 1h), it must divide a day (default 1m)")
+    parser.add_argument("--config", type=str, default=None,
+                        help="JSON or TOML file declaring several pipelines (window_size, metric, output) over the same input")
+    parser.add_argument("--metric", type=str, default="moving_average", 
+                        help="""Available metrics (or the ones registered by plugins):\n
                         - moving_average(default) -> Moving average of the last x minutes\n
-                        - maximum -> Maximum of the last x minutes""")
-    parser.add_argument("--output", type=str, default="output.json",
-                        help = """The results can be outputed to:
-                        -file (default) -> Add the destiny desired file and format
+                        - maximum -> Maximum of the last x minutes\n
+                        - ewma -> Exponentially weighted moving average of the whole stream\n
+                        - events_per_minute -> Events per minute in the last x minutes\n
+                        - words_per_minute -> Translated words per minute in the last x minutes\n
+                        - ms_per_word -> Delivery time per word, weighted by words, of the last x minutes\n
+                        - slowest -> Slowest translations of the last x minutes, with their ids and clients\n
+                        - distinct_clients -> Approximate number of distinct clients of the last x minutes\n
+                        - distinct_language_pairs -> Approximate number of distinct language pairs of the last x minutes""")
+    parser.add_argument("--half_life", type=float, default=None,
+                        help="Minutes for the weight of an event to halve in the ewma metric (default 5)")
+    parser.add_argument("--top_k", type=int, default=None,
+                        help="Number of translations listed by the slowest metric (default 5)")
+    parser.add_argument("--output", type=str, action="append", default=None,
+                        help = """The results can be outputed to (repeat to write to several destinations):
+                        -file (default output.json) -> Add the destiny desired file and format
                         -cli  -> Output the results to the terminal""")
+    parser.add_argument("--rotate_size", type=int, default=None,
+                        help="Rotate the output files when they would grow over this many bytes")
+    parser.add_argument("--rotate_interval", type=float, default=None,
+                        help="Rotate the output files every this many seconds")
+    parser.add_argument("--changes_only", action='store_true',
+                        help="Only write a result when its value changes, the skipped minutes repeat the previous value")
+    parser.add_argument("--heartbeat", type=int, default=None,
+                        help="With --changes_only, write a result at least every this many minutes")
+    parser.add_argument("--background_output", action='store_true',
+                        help="Write the results from a dedicated thread, in batches, so slow disks don't delay the processing")
+    parser.add_argument("--fsync", action='store_true',
+                        help="With --background_output, fsync the output file after each batch")
     parser.add_argument("--keep_live", action='store_true', 
                         help= "After analyze the all input file, keep waiting to read live")
+    parser.add_argument("--emit_grace", type=float, default=None,
+                        help="In live mode, emit each minute this many seconds after it ends, measured from the latest event, without waiting for the next event")
+    parser.add_argument("--late_events", type=str, default="include", choices=list(late_event_policies),
+                        help="""Events arriving after their minute was emitted are:
+                        - include(default) -> Counted in the next minutes of the window
+                        - drop -> Ignored""")
+    parser.add_argument("--validate", action='store_true',
+                        help="Validate each event with the full pydantic model, slower but stricter")
+    parser.add_argument("--event_name", type=str, default=None,
+                        help="Only process the events with this event_name, the other lines are skipped before being decoded")
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Profile the run with cProfile and write the pstats to this file, in live mode SIGUSR1 toggles it")
+    parser.add_argument("--trace_memory", type=parse_duration, default=None,
+                        help="Report the top memory allocation sites at this interval (10s, 5m, ...) and at the end")
+    parser.add_argument("--rollups", action="store_true",
+                        help="Roll up the minutes into hours and days, for windows of days or months")
+    parser.add_argument("--parse_workers", type=int, default=None,
+                        help="Parse the lines in this many processes, for numeric metrics over a single input file")
+    parser.add_argument("--dedup", action='store_true',
+                        help="Skip replayed events with a translation_id and event_name already seen in the window")
+    parser.add_argument("--control_socket", type=str, default=None,
+                        help="Unix socket answering queries about the current window (current, results [N], window, stats)")
+    parser.add_argument("--control_history", type=int, default=60,
+                        help="Number of last results kept for the results query of the control socket (default 60)")
+    parser.add_argument("--dead_letter_file", type=str, default=None,
+                        help="File where the invalid lines are written, with their byte offset and the reason")
+    parser.add_argument("--max_bad_lines", type=int, default=None,
+                        help="Stop with an error when more invalid lines than this are found")
      
     args = parser.parse_args() 
+    if args.window is not None:
+        args.window_size = args.window / 60
+
+    config = load_config(args.config) if args.config else None
+    if config is not None:
+        if not args.input_file:
+            input_file = config.get("input_file")
+            args.input_file = [input_file] if isinstance(input_file, str) else input_file
+        args.keep_live = args.keep_live or config.get("keep_live", False)
+    elif args.window_size is None:
+        parser.error("the following arguments are required: --window_size or --window (or --config)")
+
+    if not args.input_file:
+        parser.error("the following arguments are required: --input_file (or --config)")
+
+    try:
+        get_metric(args.metric)
+    except ValueError:
+        parser.error(f"argument --metric: invalid choice: '{args.metric}' (choose from {', '.join(map(repr, available_metrics))})")
     
-    #Validate input file
-    if not os.path.isfile(args.input_file):
-        raise FileNotFoundError(f"The file '{args.input_file}' does not exist.")
+    #Validate input files
+    input_files = resolve_input_files(args.input_file)
+    if args.keep_live and any(is_stream(filename) for filename in input_files):
+        raise ValueError("Stdin and named pipes are read until the end of the stream, they can't be used with --keep_live.")
 
     #Validate window size
-    if args.window_size <= 0:
+    if config is None and args.window_size <= 0:
         raise ValueError("The window size must be a positive integer.")
 
+    #Validate step
+    if args.step <= 0 or timedelta(days=1) % timedelta(seconds=args.step):
+        raise ValueError("The step must be a positive duration that divides a day.")
+    if config is None and timedelta(minutes=args.window_size) % timedelta(seconds=args.step):
+        raise ValueError("The window must be a whole number of steps.")
+
+    #Validate heartbeat
+    if args.heartbeat is not None and args.heartbeat <= 0:
+        raise ValueError("The heartbeat must be a positive number of minutes.")
+
+    #Validate rotation
+    if (args.rotate_size is not None and args.rotate_size <= 0) or (args.rotate_interval is not None and args.rotate_interval <= 0):
+        raise ValueError("The rotation size and interval must be positive.")
+
+    #Validate half life
+    if args.half_life is not None and args.half_life <= 0:
+        raise ValueError("The half life must be a positive number of minutes.")
+
+    #Validate top k
+    if args.top_k is not None and args.top_k <= 0:
+        raise ValueError("The top k must be a positive integer.")
+
+    #Validate control history
+    if args.control_history <= 0:
+        raise ValueError("The control history must be a positive integer.")
+
+    #Validate parse workers
+    if args.parse_workers is not None:
+        metrics = [pipeline["metric"] for pipeline in config["pipelines"]] if config is not None else [args.metric]
+        if args.parse_workers <= 0:
+            raise ValueError("The number of parse workers must be a positive integer.")
+        if len(input_files) > 1:
+            raise ValueError("The parse workers can only read a single input file.")
+        if args.dedup or not all(get_metric(metric).numeric_only for metric in metrics):
+            raise ValueError("The parse workers only keep the timestamp, duration and nr_words of the events, "
+                             "they can't be used with --dedup or the slowest and distinct metrics.")
+
+    #Validate memory trace interval
+    if args.trace_memory is not None and args.trace_memory <= 0:
+        raise ValueError("The memory trace interval must be a positive duration.")
+
+    #Validate grace period
+    if args.emit_grace is not None and args.emit_grace < 0:
+        raise ValueError("The emit grace period must be a positive number of seconds.")
+
+    #Validate max bad lines
+    if args.max_bad_lines is not None and args.max_bad_lines < 0:
+        raise ValueError("The maximum number of bad lines must be a positive integer.")
+
             
-    reader = Reader(args.input_file, args.keep_live)
-    processor = Processor(args.window_size, args.metric)
-    writer = Writer(args.output)
+    bad_lines = BadLines(args.dead_letter_file, args.max_bad_lines)
+    parser_pool = None
+    if args.parse_workers is not None:
+        # Imported only when requested, it starts the processes of the pool
+        from workers import ParserPool
+        parser_pool = ParserPool(args.parse_workers, args.validate, args.event_name)
+    if len(input_files) == 1:
+        reader = Reader(input_files[0], args.keep_live, bad_lines, args.validate, args.event_name, parser_pool)
+    else:
+        reader = MergedReader(input_files, args.keep_live, bad_lines, args.validate, args.event_name)
+    processor_options = dict(grace_period=args.emit_grace or 0, late_events=args.late_events, dedup=args.dedup,
+                             metric_options=dict(half_life=args.half_life, top_k=args.top_k), step=args.step,
+                             history=args.control_history, rollups=args.rollups)
+    if config is not None:
+        # Each event is parsed once and dispatched to every pipeline
+        processor = FanOut(config["pipelines"], **processor_options)
+        writer = FanOutWriter(processor.writers)
+    else:
+        processor = Processor(args.window_size, args.metric, **processor_options)
+        writer = Writer(args.output or ["output.json"], args.changes_only, args.heartbeat, args.background_output,
+                        args.fsync, args.rotate_size, args.rotate_interval)
+
+    def write_results(result) -> None:
+        '''
+        Write a single result or a list of results (gap filling)
+        '''
+        if isinstance(result, list):
+            for r in result:
+                writer.write(r)
+        elif result:
+            writer.write(result)
+
+    def emit_elapsed_minutes() -> None:
+        '''
+        Emit the minutes that ended on the event clock while waiting for new events
+        '''
+        write_results(processor.close_elapsed_minutes())
+
+    on_poll = emit_elapsed_minutes if args.emit_grace is not None else None
+
+    control = None
+    if args.control_socket:
+        from control import ControlServer
+        processors = processor.processors if config is not None else {args.window_size: processor}
+        control = ControlServer(args.control_socket, processors, lambda: {"bad_lines": bad_lines.total})
+
+    # Imported only when requested, like the control socket
+    profiler = None
+    if args.profile:
+        from profiling import Profiler
+        profiler = Profiler(args.profile)
+        if args.keep_live:
+            profiler.install_toggle()
+        profiler.start()
+    tracer = None
+    if args.trace_memory is not None:
+        from profiling import MemoryTracer
+        tracer = MemoryTracer(args.trace_memory)
    
     try:
     # First process all existing events
         for event in reader.read_existing_events():
-            result = processor.process(event)
-
-            # Handle single result
-            if result and isinstance(result, dict):
-                writer.write(result)
-
-            # Handle multiple results (gap filling)
-            elif result and isinstance(result, list):
-                for r in result:
-                    writer.write(r)
+            write_results(processor.process(event))
 
         if not args.keep_live:
             # Process the final minute of existing events, 
             # if live wait for possible events in the same minute
-            final_result = processor.finalize()
-            if final_result:
-                writer.write(final_result)
+            write_results(processor.finalize())
 
         # Now start monitoring for live events if requested
         if args.keep_live:
             print("Processing complete. Monitoring for new events...")
-            for event in reader.monitor_live_events():
-                result = processor.process(event)
-                if result:
-                    if isinstance(result, dict):
-                        writer.write(result)
-                    else:
-                        for r in result:
-                            writer.write(r)
+            for event in reader.monitor_live_events(on_poll=on_poll):
+                write_results(processor.process(event))
 
     except KeyboardInterrupt:
         #If keyboard interrupt is detected, calculate the last minute
-        final_result = processor.finalize()
-        if final_result:
-            writer.write(final_result)
+        write_results(processor.finalize())
         print("Terminating Successfully")
         sys.exit(0)
+
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        if tracer is not None:
+            tracer.close()
+        if control is not None:
+            control.close()
+        if parser_pool is not None:
+            parser_pool.close()
+        writer.close()
+        bad_lines.close()
+        if bad_lines.total:
+            print(f"Skipped invalid lines: {bad_lines.summary()}", file=sys.stderr)
        
     
 if __name__ == "__main__":
@@ -1,8 +1,12 @@
+import json
+import os
+import sys
+import subprocess
 import pytest
-from datetime import datetime
+from datetime import datetime, timedelta
 from types import SimpleNamespace
 from unittest import mock
-from unbabel_cli import main
+from unbabel_cli import main, parse_duration
 
 def test_main_integration(monkeypatch):
     """
@@ -32,7 +36,7 @@ def test_main_integration(monkeypatch):
         ]
 
         mock_processor.process.side_effect = [
-            {"date": "2025-04-20 12:00:00", "average_delivery_time": 0},
+            {"date": "2025-04-20 12:00:00", "average_delivery_time": 0.0},
             {"date": "2025-04-20 12:01:00", "average_delivery_time": 15},
         ]
         mock_processor.finalize.return_value = {"date": "2025-04-20 12:02:00", "average_delivery_time": 20}
@@ -67,7 +71,7 @@ def test_main_writes_to_file(monkeypatch, tmp_path):
         ]
 
         mock_processor.process.side_effect = [
-            {"date": "2025-04-20 12:00:00", "average_delivery_time": 0},
+            {"date": "2025-04-20 12:00:00", "average_delivery_time": 0.0},
             {"date": "2025-04-20 12:01:00", "average_delivery_time": 15},
         ]
         mock_processor.finalize.return_value = {"date": "2025-04-20 12:02:00", "average_delivery_time": 20}
@@ -78,7 +82,7 @@ def test_main_writes_to_file(monkeypatch, tmp_path):
         with open(output_file, 'r') as f:
             lines = f.readlines()
             assert len(lines) == 3
-            assert '"average_delivery_time": 0' in lines[0]
+            assert '"average_delivery_time": 0.0' in lines[0]
             assert '"average_delivery_time": 15' in lines[1]
             assert '"average_delivery_time": 20' in lines[2]
 
@@ -239,7 +243,7 @@ def test_main_keep_live_with_gap_filling(monkeypatch):
         ]
 
         # Simulate live events with a gap (e.g., missing 12:01 and 12:02)
-        def live_events():
+        def live_events(on_poll=None):
             yield SimpleNamespace(timestamp=datetime(2025, 4, 20, 12, 3), duration=20)
             raise KeyboardInterrupt  # Simulate user interrupt
 
@@ -308,7 +312,7 @@ def test_main_keyboard_interrupt(monkeypatch):
         ]
 
         # Simulate live events that raise KeyboardInterrupt
-        def live_events():
+        def live_events(on_poll=None):
             yield SimpleNamespace(timestamp=datetime(2025, 4, 20, 12, 1), duration=20)
             raise KeyboardInterrupt()
 
@@ -364,3 +368,481 @@ def test_main_gap_filling(monkeypatch):
 
         # Verify that write was called for each result
         assert mock_writer.write.call_count == 3
+
+def test_main_multiple_input_files(monkeypatch, tmp_path):
+    """
+    Test that several input files and glob patterns are merged into a single stream
+    """
+    mock_args = [
+        "unbabel_cli.py",
+        "--input_file", "example.json", str(tmp_path / "*.json"),
+        "--window_size=5",
+        "--output=cli"
+    ]
+    (tmp_path / "host_a.json").write_text("")
+    (tmp_path / "host_b.json").write_text("")
+    monkeypatch.setattr("sys.argv", mock_args)
+
+    with mock.patch("unbabel_cli.MergedReader") as MockMergedReader, \
+         mock.patch("unbabel_cli.Processor") as MockProcessor, \
+         mock.patch("unbabel_cli.Writer"):
+
+        MockMergedReader.return_value.read_existing_events.return_value = []
+        MockProcessor.return_value.finalize.return_value = None
+
+        main()
+
+        MockMergedReader.assert_called_once()
+        assert MockMergedReader.call_args.args[:2] == (
+            ["example.json", str(tmp_path / "host_a.json"), str(tmp_path / "host_b.json")], False
+        )
+
+def test_main_glob_without_matches(monkeypatch, tmp_path):
+    """
+    Test when a glob pattern matches no file
+    """
+    mock_args = [
+        "unbabel_cli.py",
+        f"--input_file={tmp_path / '*.json'}",
+        "--window_size=5",
+    ]
+    monkeypatch.setattr("sys.argv", mock_args)
+
+    with pytest.raises(FileNotFoundError, match="No file matches the pattern"):
+        main()
+
+def test_main_keep_live_emits_on_wall_clock(monkeypatch):
+    """
+    Test that with --emit_grace the elapsed minutes are written on each poll of the reader
+    """
+    mock_args = [
+        "unbabel_cli.py",
+        "--input_file=example.json",
+        "--window_size=5",
+        "--output=cli",
+        "--keep_live",
+        "--emit_grace=2"
+    ]
+    monkeypatch.setattr("sys.argv", mock_args)
+
+    with mock.patch("unbabel_cli.Reader") as MockReader, \
+         mock.patch("unbabel_cli.Processor") as MockProcessor, \
+         mock.patch("unbabel_cli.Writer") as MockWriter:
+
+        mock_reader = MockReader.return_value
+        mock_processor = MockProcessor.return_value
+        mock_writer = MockWriter.return_value
+
+        mock_reader.read_existing_events.return_value = []
+
+        def live_events(on_poll=None):
+            on_poll()
+            raise KeyboardInterrupt()
+
+        mock_reader.monitor_live_events.side_effect = live_events
+        mock_processor.close_elapsed_minutes.return_value = [
+            {"date": "2025-04-20 12:01:00", "average_delivery_time": 10}
+        ]
+        mock_processor.finalize.return_value = None
+
+        with pytest.raises(SystemExit):
+            main()
+
+        assert MockProcessor.call_args.kwargs["grace_period"] == 2
+        mock_writer.write.assert_called_once_with({"date": "2025-04-20 12:01:00", "average_delivery_time": 10})
+
+def test_main_negative_emit_grace(monkeypatch):
+    """
+    Test when the grace period is negative
+    """
+    mock_args = [
+        "unbabel_cli.py",
+        "--input_file=example.json",
+        "--window_size=5",
+        "--emit_grace=-1"
+    ]
+    monkeypatch.setattr("sys.argv", mock_args)
+
+    with pytest.raises(ValueError, match="The emit grace period must be a positive number of seconds."):
+        main()
+
+def test_main_negative_max_bad_lines(monkeypatch):
+    """
+    Test when the maximum number of bad lines is negative
+    """
+    mock_args = [
+        "unbabel_cli.py",
+        "--input_file=example.json",
+        "--window_size=5",
+        "--max_bad_lines=-1"
+    ]
+    monkeypatch.setattr("sys.argv", mock_args)
+
+    with pytest.raises(ValueError, match="The maximum number of bad lines must be a positive integer."):
+        main()
+
+def test_main_reports_bad_lines(monkeypatch, tmp_path, capsys):
+    """
+    Test that invalid lines go to the dead-letter file and are summarized on stderr, not stdout
+    """
+    input_file = tmp_path / "events.json"
+    with open("example.json") as f:
+        input_file.write_text(f.readline() + "{bad json}\n")
+    dead_letter = tmp_path / "dead_letter.json"
+    mock_args = [
+        "unbabel_cli.py",
+        f"--input_file={input_file}",
+        "--window_size=5",
+        "--output=cli",
+        f"--dead_letter_file={dead_letter}"
+    ]
+    monkeypatch.setattr("sys.argv", mock_args)
+
+    main()
+
+    captured = capsys.readouterr()
+    assert "bad json" not in captured.out
+    assert "Skipped invalid lines: 1 (invalid_json=1)" in captured.err
+    assert '"reason": "invalid_json"' in dead_letter.read_text()
+
+def test_main_config_pipelines(monkeypatch, tmp_path):
+    """
+    Test that a configuration file runs several pipelines over one input
+    """
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({
+        "input_file": "example.json",
+        "pipelines": [
+            {"window_size": 10, "metric": "moving_average", "output": str(tmp_path / "avg.json")},
+            {"window_size": 10, "metric": "maximum", "output": str(tmp_path / "max.json")},
+        ]
+    }))
+    monkeypatch.setattr("sys.argv", ["unbabel_cli.py", f"--config={config_file}"])
+
+    main()
+
+    averages = [json.loads(line) for line in (tmp_path / "avg.json").read_text().splitlines()]
+    maximums = [json.loads(line) for line in (tmp_path / "max.json").read_text().splitlines()]
+    assert len(averages) == len(maximums) == 14
+    assert averages[-1] == {"date": "2018-12-26 18:24:00", "average_delivery_time": 42.5}
+    assert maximums[-1] == {"date": "2018-12-26 18:24:00", "max_delivery_time": 54}
+
+def test_main_reads_stdin(monkeypatch, tmp_path):
+    """
+    Test that "-" processes the events piped to stdin until the end of the stream
+    """
+    read_fd, write_fd = os.pipe()
+    with open("example.json", "rb") as f:
+        os.write(write_fd, f.read())
+    os.close(write_fd)
+    monkeypatch.setattr("sys.stdin", os.fdopen(read_fd, "r"))
+
+    output_file = tmp_path / "output.json"
+    monkeypatch.setattr("sys.argv", [
+        "unbabel_cli.py",
+        "--input_file=-",
+        "--window_size=10",
+        f"--output={output_file}"
+    ])
+
+    main()
+
+    results = [json.loads(line) for line in output_file.read_text().splitlines()]
+    assert len(results) == 14
+    assert results[-1] == {"date": "2018-12-26 18:24:00", "average_delivery_time": 42.5}
+
+def test_main_stdin_keep_live(monkeypatch):
+    """
+    Test that stdin can't be monitored live
+    """
+    monkeypatch.setattr("sys.argv", ["unbabel_cli.py", "--input_file=-", "--window_size=10", "--keep_live"])
+
+    with pytest.raises(ValueError, match="can't be used with --keep_live"):
+        main()
+
+def test_main_background_output_drained_on_interrupt(monkeypatch, tmp_path):
+    """
+    Test that the background writer is drained when the live monitoring is interrupted
+    """
+    output_file = tmp_path / "output.json"
+    monkeypatch.setattr("sys.argv", [
+        "unbabel_cli.py",
+        "--input_file=example.json",
+        "--window_size=5",
+        f"--output={output_file}",
+        "--keep_live",
+        "--background_output"
+    ])
+
+    with mock.patch("unbabel_cli.Reader") as MockReader, \
+         mock.patch("unbabel_cli.Processor") as MockProcessor:
+
+        mock_reader = MockReader.return_value
+        mock_processor = MockProcessor.return_value
+
+        mock_reader.read_existing_events.return_value = [
+            SimpleNamespace(timestamp=datetime(2025, 4, 20, 12, 0), duration=10)
+        ]
+
+        def live_events(on_poll=None):
+            raise KeyboardInterrupt()
+
+        mock_reader.monitor_live_events.side_effect = live_events
+        mock_processor.process.return_value = [
+            {"date": f"2025-04-20 12:{m:02d}:00", "average_delivery_time": m} for m in range(50)
+        ]
+        mock_processor.finalize.return_value = {"date": "2025-04-20 12:50:00", "average_delivery_time": 50}
+
+        with pytest.raises(SystemExit):
+            main()
+
+    results = [json.loads(line) for line in output_file.read_text().splitlines()]
+    assert [r["average_delivery_time"] for r in results] == list(range(51))
+
+def test_main_multiple_outputs(monkeypatch, tmp_path, capsys):
+    """
+    Test that --output can be repeated to write the results to several destinations
+    """
+    output_file = tmp_path / "output.json"
+    monkeypatch.setattr("sys.argv", [
+        "unbabel_cli.py",
+        "--input_file=example.json",
+        "--window_size=10",
+        f"--output={output_file}",
+        "--output=cli"
+    ])
+
+    main()
+
+    lines = output_file.read_text().splitlines()
+    assert len(lines) == 14
+    assert [line for line in capsys.readouterr().out.splitlines() if line] == lines
+
+def test_main_ewma_metric(monkeypatch, tmp_path):
+    """
+    Test that the ewma metric is selectable with its half life
+    """
+    output_file = tmp_path / "output.json"
+    monkeypatch.setattr("sys.argv", [
+        "unbabel_cli.py",
+        "--input_file=example.json",
+        "--window_size=1",
+        "--metric=ewma",
+        "--half_life=2.5",
+        f"--output={output_file}"
+    ])
+
+    main()
+
+    results = [json.loads(line) for line in output_file.read_text().splitlines()]
+    assert results[0]["ewma_delivery_time"] == 0
+    # Not windowed, the last events are still weighted after the window of one minute
+    assert results[-1]["ewma_delivery_time"] > 0
+
+
+def test_main_invalid_half_life(monkeypatch):
+    """
+    Test when the half life is not positive
+    """
+    monkeypatch.setattr("sys.argv", [
+        "unbabel_cli.py",
+        "--input_file=example.json",
+        "--window_size=5",
+        "--metric=ewma",
+        "--half_life=0"
+    ])
+
+    with pytest.raises(ValueError, match="The half life must be a positive number of minutes."):
+        main()
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("10s", 10), ("5m", 300), ("1h", 3600), ("7d", 604800), ("1.5m", 90), ("30", 30)],
+    ids=["seconds", "minutes", "hours", "days", "fraction", "without_unit"]
+)
+def test_parse_duration(value, expected):
+    """
+    Test the durations of --step and --window
+    """
+    assert parse_duration(value) == expected
+
+
+def test_main_sub_minute_step(monkeypatch, tmp_path):
+    """
+    Test the outputs every 10 seconds over a window of 5 minutes
+    """
+    output_file = tmp_path / "output.json"
+    monkeypatch.setattr("sys.argv", [
+        "unbabel_cli.py",
+        "--input_file=example.json",
+        "--window=5m",
+        "--step=10s",
+        f"--output={output_file}"
+    ])
+
+    main()
+
+    dates = [datetime.fromisoformat(json.loads(line)["date"]) for line in output_file.read_text().splitlines()]
+    assert dates[0] == datetime(2018, 12, 26, 18, 11)
+    assert all(later - earlier == timedelta(seconds=10) for earlier, later in zip(dates, dates[1:]))
+
+
+@pytest.mark.parametrize(
+    "args, error",
+    [
+        (["--window_size=5", "--window=5m"], SystemExit),
+        (["--window=5m", "--step=7s"], ValueError),
+        (["--window=5m", "--step=soon"], SystemExit),
+        (["--window=30s"], ValueError),
+        (["--window=25s", "--step=10s"], ValueError),
+    ],
+    ids=["window_and_window_size", "step_not_dividing_a_day", "invalid_duration", "window_shorter_than_step",
+         "window_not_multiple_of_step"]
+)
+def test_main_invalid_window_or_step(monkeypatch, args, error):
+    """
+    Test the invalid combinations of --window, --window_size and --step
+    """
+    monkeypatch.setattr("sys.argv", ["unbabel_cli.py", "--input_file=example.json", *args])
+
+    with pytest.raises(error):
+        main()
+
+
+def test_main_control_socket(monkeypatch, tmp_path):
+    """
+    Test that the control socket is served while processing and removed at the end
+    """
+    path = tmp_path / "control.sock"
+    stats = []
+    import control
+    close = control.ControlServer.close
+
+    def close_after_stats(self):
+        stats.append(self.query("stats"))
+        close(self)
+
+    monkeypatch.setattr(control.ControlServer, "close", close_after_stats)
+    monkeypatch.setattr("sys.argv", [
+        "unbabel_cli.py",
+        "--input_file=example.json",
+        "--window_size=10",
+        f"--output={tmp_path / 'output.json'}",
+        f"--control_socket={path}"
+    ])
+
+    main()
+
+    assert stats == [{"events": 3, "late_events": 0, "duplicates": 0, "bad_lines": 0}]
+    assert not path.exists()
+
+
+def test_main_parse_workers(monkeypatch, tmp_path):
+    """
+    Test that the outputs are the same when the lines are parsed by the pool of processes
+    """
+    outputs = []
+    for extra in ([], ["--parse_workers=2"]):
+        output_file = tmp_path / f"output{len(outputs)}.json"
+        monkeypatch.setattr("sys.argv", [
+            "unbabel_cli.py",
+            "--input_file=example.json",
+            "--window_size=10",
+            "--metric=words_per_minute",
+            f"--output={output_file}",
+            *extra
+        ])
+        main()
+        outputs.append(output_file.read_text())
+
+    assert outputs[0] == outputs[1]
+
+
+@pytest.mark.parametrize(
+    "args, error",
+    [
+        (["--parse_workers=0"], "The number of parse workers must be a positive integer."),
+        (["--parse_workers=2", "--metric=slowest"], "The parse workers only keep"),
+        (["--parse_workers=2", "--dedup"], "The parse workers only keep"),
+        (["--parse_workers=2", "--input_file", "example.json", "{other}"], "The parse workers can only read a single input file."),
+    ],
+    ids=["not_positive", "id_based_metric", "dedup", "several_files"]
+)
+def test_main_invalid_parse_workers(monkeypatch, tmp_path, args, error):
+    """
+    Test the options the parse workers can't be used with
+    """
+    other = tmp_path / "other.json"
+    other.write_text("")
+    args = [arg.format(other=other) for arg in args]
+    monkeypatch.setattr("sys.argv", ["unbabel_cli.py", "--input_file=example.json", "--window_size=10", *args])
+
+    with pytest.raises(ValueError, match=error):
+        main()
+
+
+def test_main_rollups(monkeypatch, tmp_path):
+    """
+    Test that the rolled up window gives the same outputs for a short window
+    """
+    outputs = []
+    for extra in ([], ["--rollups"]):
+        output_file = tmp_path / f"output{len(outputs)}.json"
+        monkeypatch.setattr("sys.argv", [
+            "unbabel_cli.py",
+            "--input_file=example.json",
+            "--window_size=10",
+            f"--output={output_file}",
+            *extra
+        ])
+        main()
+        outputs.append(output_file.read_text())
+
+    assert outputs[0] == outputs[1]
+
+
+def test_main_profile_and_trace_memory(monkeypatch, tmp_path, capsys):
+    """
+    Test that the run is profiled to a pstats file and the memory reports are written to stderr
+    """
+    import pstats
+    profile = tmp_path / "run.pstats"
+    monkeypatch.setattr("sys.argv", [
+        "unbabel_cli.py",
+        "--input_file=example.json",
+        "--window_size=10",
+        f"--output={tmp_path / 'output.json'}",
+        f"--profile={profile}",
+        "--trace_memory=1m"
+    ])
+
+    main()
+
+    assert any(function == "process" for _, _, function in pstats.Stats(str(profile)).stats)
+    assert "Memory report 1" in capsys.readouterr().err
+
+
+# Budget of the cumulative import time of the CLI, in microseconds
+STARTUP_IMPORT_BUDGET_US = 300_000
+
+def test_startup_imports(tmp_path):
+    """
+    Startup benchmark with python -X importtime: the CLI must not import pydantic
+    unless validation is requested, and its imports must stay within the budget
+    """
+    src = os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import unbabel_cli"],
+        cwd=src, capture_output=True, text=True, check=True
+    )
+
+    # Lines are "import time: self [us] | cumulative | imported package"
+    imports = {}
+    for line in completed.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            imports[name.strip()] = int(cumulative)
+
+    assert "pydantic" not in imports
+    assert imports["unbabel_cli"] < STARTUP_IMPORT_BUDGET_US
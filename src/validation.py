@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, Dict
+from values import Event
+
+
+class ValidatedEvent(BaseModel):
+    """
+    Event class to validate an event using Pydantic
+    """
+    timestamp: datetime
+    translation_id: str
+    source_language: str
+    target_language: str
+    client_name: str
+    event_name: str
+    nr_words: int
+    duration: float = Field(ge=0)
+
+
+def validate_event(data: Dict[str, Any]) -> Event:
+    """
+    Validate the decoded JSON data with pydantic and create the event, raising KeyError for missing fields
+    """
+    missing = [field for field in ValidatedEvent.model_fields if field not in data]
+    if missing:
+        raise KeyError(missing[0])
+
+    validated = ValidatedEvent(**{field: data[field] for field in ValidatedEvent.model_fields})
+    return Event(**validated.model_dump())
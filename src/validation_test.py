@@ -0,0 +1,49 @@
+import pytest
+from datetime import datetime
+from validation import validate_event
+from values import Event
+
+def make_event_data(**changes):
+    data = {
+        "timestamp": "2018-12-26 18:23:19.903159",
+        "translation_id": "abc123",
+        "source_language": "en",
+        "target_language": "pt",
+        "client_name": "taxi-eats",
+        "event_name": "translation_delivered",
+        "nr_words": 100,
+        "duration": 5
+    }
+    data.update(changes)
+    return data
+
+def test_validate_event():
+    """
+    Test that a valid event is converted to the plain Event class
+    """
+    event = validate_event(make_event_data())
+    assert isinstance(event, Event)
+    assert event.timestamp == datetime(2018, 12, 26, 18, 23, 19, 903159)
+    assert event.duration == 5
+
+@pytest.mark.parametrize(
+    "data, expected_exception",
+    [
+        ({k: v for k, v in make_event_data().items() if k != "client_name"}, KeyError),
+        (make_event_data(duration=-1), ValueError),
+        (make_event_data(nr_words="many"), ValueError),
+        (make_event_data(translation_id=123), ValueError),
+    ],
+    ids=[
+        "missing_key",
+        "negative_duration",
+        "invalid_nr_words",
+        "strict_string"
+    ]
+)
+def test_validate_event_errors(data, expected_exception):
+    """
+    Test that invalid events raise KeyError for missing fields and ValueError for invalid values
+    """
+    with pytest.raises(expected_exception):
+        validate_event(data)
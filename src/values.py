@@ -1,34 +1,132 @@
-from pydantic import BaseModel, Field
-from datetime import datetime
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
 
-class Event(BaseModel):
+# Unix timestamps above this are in milliseconds, like pydantic
+MAX_EPOCH_SECONDS = 2e10
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Fraction of the seconds of an ISO 8601 timestamp, fromisoformat only accepts 3 or 6 digits before Python 3.11
+ISO_FRACTION = re.compile(r"(\d{2}:\d{2}:\d{2})\.(\d+)")
+
+
+def parse_epoch(value: float) -> datetime:
+    '''
+    Convert a Unix timestamp, in seconds or milliseconds, to a UTC datetime
+    '''
+    if abs(value) > MAX_EPOCH_SECONDS:
+        value = value / 1000
+    try:
+        return EPOCH + timedelta(seconds=value)
+    except OverflowError:
+        raise ValueError(f"Timestamp out of range: {value!r}")
+
+
+def parse_timestamp(value: Any) -> datetime:
+    '''
+    Parse an ISO 8601 timestamp, also accepting the "Z" suffix for UTC, or a Unix timestamp,
+    the same timestamps the pydantic model of --validate accepts
+    '''
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return parse_epoch(value)
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    try:
+        return parse_epoch(float(value))
+    except ValueError:
+        pass
+    # Fractions of any number of digits, truncated to microseconds
+    return datetime.fromisoformat(ISO_FRACTION.sub(lambda match: f"{match[1]}.{match[2][:6]:0<6}", value, count=1))
+
+
+def parse_int(value: Any) -> int:
+    '''
+    Convert a whole number, rejecting the numbers with a fractional part instead of truncating them
+    '''
+    if isinstance(value, int):
+        return int(value)
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"The number must be a whole number: {value!r}")
+    return int(number)
+
+
+class Event:
     """
-    Event class to represent an event using Pydantic
+    Event class to represent an event.
+    Plain class with slots, the full validation with pydantic is in validation.py
     """
-    timestamp: datetime
-    translation_id: str
-    source_language: str
-    target_language: str
-    client_name: str
-    event_name: str
-    nr_words: int
-    duration: float = Field(ge=0)  
+    __slots__ = ("timestamp", "translation_id", "source_language", "target_language",
+                 "client_name", "event_name", "nr_words", "duration")
+
+    def __init__(self, *, timestamp: datetime, translation_id: str, source_language: str, target_language: str,
+                 client_name: str, event_name: str, nr_words: int, duration: float) -> None:
+        self.timestamp = parse_timestamp(timestamp)
+        self.translation_id = translation_id
+        self.source_language = source_language
+        self.target_language = target_language
+        self.client_name = client_name
+        self.event_name = event_name
+        self.nr_words = parse_int(nr_words)
+        self.duration = float(duration)
+
+        if self.duration < 0:
+            raise ValueError("The duration must be greater than or equal to 0")
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"Event({fields})"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Event":
+        """
+        Create the event from the decoded JSON data, raising KeyError for missing fields
+        """
+        return cls(
+            timestamp = data['timestamp'],
+            translation_id = data['translation_id'],
+            source_language = data['source_language'],
+            target_language = data['target_language'],
+            client_name = data['client_name'],
+            event_name = data['event_name'],
+            nr_words = data['nr_words'],
+            duration = data['duration']
+        )
     
-class EventResult(BaseModel):
+    
+class EventResult:
     """
     EventResult class to represent the result aggregated events
     """
-    date: datetime
-    delivery_time_op: float = Field(ge=0)
+    __slots__ = ("date", "delivery_time_op")
+
+    def __init__(self, date: datetime, delivery_time_op: float) -> None:
+        self.date = date
+        # Numbers are written as floats, like the pydantic model did, the lists like the slowest translations as they are
+        self.delivery_time_op = float(delivery_time_op) if isinstance(delivery_time_op, (int, float)) else delivery_time_op
+
+    def format(self, output_field: str) -> Dict[str, Any]:
+        """
+        Format the event result with the value under the output field of the metric
+        """
+        return {"date": str(self.date), output_field: self.delivery_time_op}
 
     def format_moving_average(self) -> str:
         """
         Format the event result moving average to a string
         """
-        return {"date": str(self.date), "average_delivery_time": self.delivery_time_op}
+        return self.format("average_delivery_time")
     
     def format_maximum(self) -> str:
         """
         Format the event result maximum to a string
         """
-        return {"date": str(self.date), "max_delivery_time": self.delivery_time_op}
\ No newline at end of file
+        return self.format("max_delivery_time")
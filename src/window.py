@@ -0,0 +1,311 @@
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple, Type
+from collections import deque
+from metrics_ import IncrementalMetric
+
+# Sizes of the coarse buckets the steps are rolled up into, finest first
+ROLLUP_SIZES = (timedelta(hours=1), timedelta(days=1))
+
+# A level of coarse buckets is only used when the window holds at least this many of them,
+# so the oldest bucket, which is evicted as a whole, is at most this fraction of the window
+ROLLUP_BUCKETS = 24
+
+
+class MetricWindow:
+    '''
+    Aggregate of the partials of a metric in the window, oldest partial first
+    '''
+
+    def __init__(self, metric: Type[IncrementalMetric]) -> None:
+        self.metric = metric
+
+    def push(self, partial: IncrementalMetric) -> None:
+        raise NotImplementedError("Subclasses must implement push method")
+
+    def pop(self) -> None:
+        raise NotImplementedError("Subclasses must implement pop method")
+
+    def aggregate(self) -> IncrementalMetric:
+        raise NotImplementedError("Subclasses must implement aggregate method")
+
+    def result(self) -> float:
+        return self.aggregate().result()
+
+
+class CumulativeWindow(MetricWindow):
+    '''
+    Window of the metrics over the whole stream, the partials are never evicted
+    '''
+
+    def __init__(self, metric: Type[IncrementalMetric]) -> None:
+        super().__init__(metric)
+        self.total = metric()
+
+    def push(self, partial: IncrementalMetric) -> None:
+        self.total.merge(partial)
+
+    def pop(self) -> None:
+        pass
+
+    def aggregate(self) -> IncrementalMetric:
+        return self.total
+
+
+class InvertibleWindow(MetricWindow):
+    '''
+    Window of the invertible metrics, the oldest partial is subtracted from the aggregate
+    '''
+
+    def __init__(self, metric: Type[IncrementalMetric]) -> None:
+        super().__init__(metric)
+        self.total = metric()
+        self.partials: Deque[IncrementalMetric] = deque()
+
+    def push(self, partial: IncrementalMetric) -> None:
+        self.total.merge(partial)
+        self.partials.append(partial)
+
+    def pop(self) -> None:
+        self.total.evict(self.partials.popleft())
+
+    def aggregate(self) -> IncrementalMetric:
+        return self.total
+
+
+class TwoStacksWindow(MetricWindow):
+    '''
+    Window of the metrics that can only be merged, like the maximum.
+    New partials go to the back stack, with its running aggregate. When the front stack is empty,
+    the back stack is moved to it, each partial with the aggregate of itself and the newer ones.
+    Each partial is merged at most twice, so the window costs amortized O(1) per minute.
+    '''
+
+    def __init__(self, metric: Type[IncrementalMetric]) -> None:
+        super().__init__(metric)
+        # Oldest partial last, with the aggregate of it and the newer ones in the front stack
+        self.front: List[IncrementalMetric] = []
+        self.back: List[IncrementalMetric] = []
+        self.back_aggregate = metric()
+
+    def push(self, partial: IncrementalMetric) -> None:
+        self.back.append(partial)
+        self.back_aggregate.merge(partial)
+
+    def pop(self) -> None:
+        if not self.front:
+            aggregate = self.metric()
+            while self.back:
+                partial = self.back.pop()
+                partial.merge(aggregate)
+                aggregate = partial
+                self.front.append(aggregate)
+            self.back_aggregate = self.metric()
+        self.front.pop()
+
+    def aggregate(self) -> IncrementalMetric:
+        if not self.front:
+            return self.back_aggregate
+        aggregate = self.front[-1].copy()
+        aggregate.merge(self.back_aggregate)
+        return aggregate
+
+
+def create_window(metric: Type[IncrementalMetric]) -> MetricWindow:
+    '''
+    Select the cheapest window the metric supports
+    '''
+    if not metric.windowed:
+        return CumulativeWindow(metric)
+    if metric.invertible:
+        return InvertibleWindow(metric)
+    return TwoStacksWindow(metric)
+
+
+class MovingWindow:
+    '''
+    Per minute partials of several metrics over the time window.
+    The events are added to the partial of the open minute, which joins the window when it is sealed.
+    Metrics declaring the same partial class share its partials and window.
+    '''
+
+    def __init__(self, metrics: Dict[str, Type[IncrementalMetric]]) -> None:
+        self.metrics = metrics
+        # Window of each partial class, in the order of the metrics
+        self.partials: Dict[str, Type[IncrementalMetric]] = {
+            name: metric.partial or metric for name, metric in metrics.items()
+        }
+        self.windows: Dict[Type[IncrementalMetric], MetricWindow] = {
+            partial: create_window(partial) for partial in self.partials.values()
+        }
+        # Minutes of the partials in the windows, oldest first
+        self.minutes: Deque[datetime] = deque()
+        self.open_minute: Optional[datetime] = None
+        self.open_partials: Dict[Type[IncrementalMetric], IncrementalMetric] = {}
+
+    def add(self, minute: datetime, event) -> None:
+        '''
+        Add the event to the partials of the minute
+        '''
+        if minute != self.open_minute:
+            self.seal(minute)
+            self.open_minute = minute
+            self.open_partials = {partial: partial() for partial in self.windows}
+        for partial in self.open_partials.values():
+            partial.add(event)
+
+    def seal(self, minute: datetime) -> None:
+        '''
+        Move the open partials to the windows once their minute is up to the minute
+        '''
+        if self.open_minute is None or self.open_minute > minute:
+            return
+        for partial_class, partial in self.open_partials.items():
+            self.windows[partial_class].push(partial)
+        self.minutes.append(self.open_minute)
+        self.open_minute = None
+        self.open_partials = {}
+
+    def evict(self, to_popleft: datetime) -> None:
+        '''
+        Remove the partials of the minutes that ended before to_popleft
+        '''
+        while self.minutes and self.minutes[0] <= to_popleft:
+            self.minutes.popleft()
+            for window in self.windows.values():
+                window.pop()
+
+    def result(self, name: str) -> float:
+        '''
+        Value of the metric for the sealed minutes in the window
+        '''
+        return self.metrics[name].summarize(self.windows[self.partials[name]].aggregate())
+
+    def open_result(self, name: str) -> float:
+        '''
+        Value of the metric for the events of the open minute only
+        '''
+        partial_class = self.partials[name]
+        partial = self.open_partials.get(partial_class)
+        if partial is None:
+            partial = partial_class()
+        return self.metrics[name].summarize(partial)
+
+    def __len__(self) -> int:
+        return len(self.minutes)
+
+
+def period_end(dt: datetime, size: timedelta) -> datetime:
+    '''
+    Return the end of the period of the given size that contains the end of step, periods are aligned to the start of the day
+    '''
+    midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight - (midnight - dt) // size * size
+
+
+class RollupLevel:
+    '''
+    Buckets of a level of the rollup window, oldest first, with the windows of their partials
+    '''
+
+    def __init__(self, size: timedelta, partials: List[Type[IncrementalMetric]]) -> None:
+        self.size = size
+        self.partials = partials
+        self.reset()
+
+    def reset(self) -> None:
+        # End of the first and last step of each bucket
+        self.buckets: Deque[Tuple[datetime, datetime]] = deque()
+        self.windows: Dict[Type[IncrementalMetric], MetricWindow] = {
+            partial: create_window(partial) for partial in self.partials
+        }
+
+    def push(self, first: datetime, last: datetime, partials: Dict[Type[IncrementalMetric], IncrementalMetric]) -> None:
+        for partial_class, partial in partials.items():
+            self.windows[partial_class].push(partial)
+        self.buckets.append((first, last))
+
+    def pop(self) -> None:
+        self.buckets.popleft()
+        for window in self.windows.values():
+            window.pop()
+
+    def rollup(self) -> Tuple[datetime, datetime, Dict[Type[IncrementalMetric], IncrementalMetric]]:
+        '''
+        Merge the buckets of the level into a single bucket, leaving the level empty
+        '''
+        first, last = self.buckets[0][0], self.buckets[-1][1]
+        partials = {partial_class: window.aggregate() for partial_class, window in self.windows.items()}
+        self.reset()
+        return first, last, partials
+
+
+class RollupWindow(MovingWindow):
+    '''
+    Moving window for very long windows, with the steps rolled up into hours and days.
+    The steps of the current hour are kept as they are, the hours of the current day are rolled up into
+    one bucket each, and the older days into one bucket each, so a window of 30 days keeps around
+    60 + 24 + 31 partials instead of 43200, and each output merges one aggregate per level.
+    A coarse bucket is evicted as a whole once all its steps left the window, so the oldest edge of the
+    window is rounded out to its bucket: the results are the ones of up to one bucket more than the window,
+    and the rates are divided by the minutes actually covered. Keeping the oldest edge exact would need
+    the steps of every bucket, since each one becomes the oldest, which is the memory the rollups save.
+    The levels are only used when the window holds ROLLUP_BUCKETS of their buckets, so the extra time
+    is at most 1/24 of the window, and windows shorter than a day are exact.
+    '''
+
+    def __init__(self, metrics: Dict[str, Type[IncrementalMetric]], window: timedelta, step: timedelta) -> None:
+        super().__init__(metrics)
+        self.window = window
+        self.step = step
+        # Time covered before the start of the window by the oldest bucket
+        self.extra = timedelta(0)
+        partials = list(self.windows)
+        # Finest level first, the first level keeps each step in its own bucket
+        self.levels: List[RollupLevel] = [RollupLevel(step, partials)] + [
+            RollupLevel(size, partials) for size in ROLLUP_SIZES
+            if size > step and not size % step and size * ROLLUP_BUCKETS <= window
+        ]
+
+    def seal(self, minute: datetime) -> None:
+        if self.open_minute is None or self.open_minute > minute:
+            return
+        self.push(0, self.open_minute, self.open_minute, self.open_partials)
+        self.open_minute = None
+        self.open_partials = {}
+
+    def push(self, index: int, first: datetime, last: datetime,
+             partials: Dict[Type[IncrementalMetric], IncrementalMetric]) -> None:
+        '''
+        Add a bucket to the level, rolling up first the buckets of the level that are in an earlier coarse bucket
+        '''
+        level = self.levels[index]
+        if index + 1 < len(self.levels) and level.buckets:
+            size = self.levels[index + 1].size
+            if period_end(level.buckets[-1][1], size) != period_end(last, size):
+                self.push(index + 1, *level.rollup())
+        level.push(first, last, partials)
+
+    def evict(self, to_popleft: datetime) -> None:
+        # The coarsest levels hold the oldest buckets
+        self.extra = timedelta(0)
+        for level in reversed(self.levels):
+            while level.buckets and level.buckets[0][1] <= to_popleft:
+                level.pop()
+            if level.buckets:
+                self.extra = max(timedelta(0), to_popleft - (level.buckets[0][0] - self.step))
+                return
+
+    def result(self, name: str) -> float:
+        partial_class = self.partials[name]
+        if len(self.levels) == 1:
+            return self.metrics[name].summarize(self.levels[0].windows[partial_class].aggregate())
+        # The not windowed metrics keep the evicted buckets, so the empty levels are merged too
+        aggregate = self.levels[-1].windows[partial_class].aggregate().copy()
+        for level in reversed(self.levels[:-1]):
+            aggregate.merge(level.windows[partial_class].aggregate())
+        if self.extra:
+            aggregate.span = (self.window + self.extra) / timedelta(minutes=1)
+        return self.metrics[name].summarize(aggregate)
+
+    def __len__(self) -> int:
+        return sum(len(level.buckets) for level in self.levels)
@@ -0,0 +1,176 @@
+import pytest
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from metrics_ import MovingAverage, Maximum, EventsPerMinute, DeliveryTimePerWord, configure_metric
+from window import CumulativeWindow, InvertibleWindow, TwoStacksWindow, MovingWindow, RollupWindow, create_window, period_end
+
+
+@pytest.mark.parametrize(
+    "metric, expected",
+    [
+        (MovingAverage, InvertibleWindow),
+        (Maximum, TwoStacksWindow),
+        (type("Total", (MovingAverage,), {"windowed": False}), CumulativeWindow),
+    ],
+    ids=["invertible", "merge_only", "not_windowed"]
+)
+def test_create_window(metric, expected):
+    """
+    Test that each metric gets the cheapest window it supports
+    """
+    assert isinstance(create_window(metric), expected)
+
+
+@pytest.mark.parametrize("metric", [MovingAverage, Maximum], ids=["moving_average", "maximum"])
+def test_window_matches_full_recompute(metric):
+    """
+    Test that the incremental window gives the same result as computing the metric over all its events
+    """
+    rng = random.Random(7)
+    window = create_window(metric)
+    minutes = []
+    for _ in range(200):
+        events = [SimpleNamespace(duration=rng.randint(1, 100)) for _ in range(rng.randint(0, 3))]
+        partial = metric()
+        for event in events:
+            partial.add(event)
+        window.push(partial)
+        minutes.append(events)
+
+        while len(minutes) > 5 or (minutes and rng.random() < 0.1):
+            window.pop()
+            minutes.pop(0)
+
+        assert window.result() == pytest.approx(metric().compute([e for events in minutes for e in events]))
+
+
+def test_moving_window_seals_and_evicts():
+    """
+    Test that the open minute only joins the window when sealed, and old minutes are evicted
+    """
+    window = MovingWindow({"maximum": Maximum})
+    base = datetime(2025, 4, 20, 12, 1)
+    window.add(base, SimpleNamespace(duration=30))
+    window.add(base + timedelta(minutes=1), SimpleNamespace(duration=10))
+    assert len(window) == 1 and window.result("maximum") == 30
+
+    window.seal(base + timedelta(minutes=1))
+    assert len(window) == 2 and window.result("maximum") == 30
+
+    window.evict(base)
+    assert len(window) == 1 and window.result("maximum") == 10
+
+
+def test_moving_window_shares_partials():
+    """
+    Test that the metrics with the same partial class share a single window
+    """
+    window = MovingWindow({"events_per_minute": EventsPerMinute, "ms_per_word": DeliveryTimePerWord,
+                           "maximum": Maximum})
+    assert len(window.windows) == 2
+
+    minute = datetime(2025, 4, 20, 12, 1)
+    window.add(minute, SimpleNamespace(nr_words=10, duration=30))
+    window.add(minute, SimpleNamespace(nr_words=20, duration=30))
+    window.seal(minute)
+    assert (window.result("events_per_minute"), window.result("ms_per_word"), window.result("maximum")) == (2, 2, 30)
+
+
+@pytest.mark.parametrize(
+    "dt, size, expected",
+    [
+        (datetime(2025, 4, 20, 12, 1), timedelta(hours=1), datetime(2025, 4, 20, 13, 0)),
+        (datetime(2025, 4, 20, 13, 0), timedelta(hours=1), datetime(2025, 4, 20, 13, 0)),
+        (datetime(2025, 4, 20, 0, 0), timedelta(days=1), datetime(2025, 4, 20, 0, 0)),
+        (datetime(2025, 4, 20, 0, 1), timedelta(days=1), datetime(2025, 4, 21, 0, 0)),
+    ],
+    ids=["start_of_hour", "end_of_hour", "end_of_day", "start_of_day"]
+)
+def test_period_end(dt, size, expected):
+    """
+    Test the coarse bucket of the end of a step
+    """
+    assert period_end(dt, size) == expected
+
+
+@pytest.mark.parametrize(
+    "window, levels",
+    [(timedelta(hours=10), 1), (timedelta(days=2), 2), (timedelta(days=30), 3)],
+    ids=["short", "days", "month"]
+)
+def test_rollup_window_levels(window, levels):
+    """
+    Test that the coarse levels are only used when the window holds enough of their buckets
+    """
+    assert len(RollupWindow({"maximum": Maximum}, window, timedelta(minutes=1)).levels) == levels
+
+
+@pytest.mark.parametrize("metric", [MovingAverage, Maximum], ids=["moving_average", "maximum"])
+def test_rollup_window_rounds_out_oldest_bucket(metric):
+    """
+    Test that the results match a full recompute over the window rounded out to its oldest bucket,
+    and the number of partials stays bounded
+    """
+    window_size, step = timedelta(days=30), timedelta(minutes=1)
+    window = RollupWindow({"metric": metric}, window_size, step)
+    rng = random.Random(3)
+    base = datetime(2025, 4, 20, 12, 1)
+    # Sparse events over 40 days, with the steps of their minutes
+    events = []
+    minute = base
+    while minute < base + timedelta(days=40):
+        events.append((minute, SimpleNamespace(duration=rng.randint(1, 1000))))
+        minute += timedelta(minutes=rng.randint(1, 90))
+
+    checked = 0
+    for minute, event in events:
+        window.add(minute, event)
+        window.seal(minute)
+        window.evict(minute - window_size)
+        assert len(window) <= 60 + 24 + 31
+
+        oldest = window.levels[-1].buckets[0][0] if window.levels[-1].buckets else None
+        if oldest is None:
+            continue
+        # The oldest bucket is kept whole, the window covers at most one more day
+        assert minute - window_size - timedelta(days=1) < oldest - step
+        expected = [e for m, e in events if oldest <= m <= minute]
+        assert window.result("metric") == pytest.approx(metric().compute(expected))
+        checked += 1
+    assert checked > 100
+
+
+@pytest.mark.parametrize("window_size", [timedelta(days=1), timedelta(days=30)], ids=["1d", "30d"])
+def test_rollup_window_rates_use_covered_minutes(window_size):
+    """
+    Test that the rates are divided by the minutes covered with the oldest bucket, so a steady stream
+    of one event per minute always gives one event per minute
+    """
+    metric = configure_metric(EventsPerMinute, {"window_size": window_size / timedelta(minutes=1)})
+    window = RollupWindow({"events_per_minute": metric}, window_size, timedelta(minutes=1))
+    base = datetime(2025, 4, 20, 12, 1)
+    for i in range(int(window_size / timedelta(minutes=1)) + 3 * 24 * 60):
+        minute = base + timedelta(minutes=i)
+        window.add(minute, SimpleNamespace(duration=1, nr_words=1))
+        window.seal(minute)
+        window.evict(minute - window_size)
+        if minute - base >= window_size:
+            assert window.result("events_per_minute") == pytest.approx(1.0)
+
+
+def test_rollup_window_exact_for_short_windows():
+    """
+    Test that a window without coarse levels gives the same results as the moving window
+    """
+    rollup = RollupWindow({"maximum": Maximum}, timedelta(minutes=10), timedelta(minutes=1))
+    moving = MovingWindow({"maximum": Maximum})
+    base = datetime(2025, 4, 20, 12, 1)
+    for i in range(100):
+        minute = base + timedelta(minutes=i)
+        for window in (rollup, moving):
+            window.add(minute, SimpleNamespace(duration=(i * 37) % 101))
+            window.seal(minute)
+            window.evict(minute - timedelta(minutes=10))
+        assert rollup.result("maximum") == moving.result("maximum")
+        assert len(rollup) == len(moving)
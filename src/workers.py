@@ -0,0 +1,196 @@
+import struct
+import multiprocessing
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Deque, Dict, Generator, Iterable, List, Optional, Tuple
+from read import InvalidEventError, Reader
+
+# Lines sent to a parser process at once, in live mode a smaller batch is sent at the end of each poll
+BATCH_SIZE = 1024
+
+# Batches each parser process can have in flight, each one with its slot in the ring buffer
+RING_SLOTS = 4
+
+# Compact record of a parsed event: seconds and microseconds since the epoch of the local time,
+# UTC offset in seconds (NAIVE for timestamps without timezone), duration and number of words
+RECORD = struct.Struct("<qiidq")
+NAIVE = -(1 << 31)
+EPOCH = datetime(1970, 1, 1)
+
+
+class NumericEvent:
+    '''
+    Event rebuilt from a compact record, only with the fields used by the numeric metrics
+    '''
+    __slots__ = ("timestamp", "duration", "nr_words")
+
+    def __init__(self, timestamp: datetime, duration: float, nr_words: int) -> None:
+        self.timestamp = timestamp
+        self.duration = duration
+        self.nr_words = nr_words
+
+    def __repr__(self) -> str:
+        return f"NumericEvent(timestamp={self.timestamp!r}, duration={self.duration!r}, nr_words={self.nr_words!r})"
+
+
+def pack_event(buffer: Any, offset: int, event: Any) -> None:
+    '''
+    Write the compact record of the event at the offset of the buffer
+    '''
+    timestamp = event.timestamp
+    utc_offset = timestamp.utcoffset()
+    elapsed = timestamp.replace(tzinfo=None) - EPOCH
+    RECORD.pack_into(buffer, offset, elapsed.days * 86400 + elapsed.seconds, elapsed.microseconds,
+                     NAIVE if utc_offset is None else int(utc_offset.total_seconds()), event.duration, event.nr_words)
+
+
+def unpack_events(buffer: Any, count: int) -> Generator[NumericEvent, None, None]:
+    '''
+    Rebuild the events of the first count records of the buffer
+    '''
+    timezones: Dict[int, timezone] = {}
+    for seconds, microseconds, utc_offset, duration, nr_words in RECORD.iter_unpack(buffer[:count * RECORD.size]):
+        timestamp = EPOCH + timedelta(seconds=seconds, microseconds=microseconds)
+        if utc_offset != NAIVE:
+            tz = timezones.get(utc_offset)
+            if tz is None:
+                tz = timezones[utc_offset] = timezone(timedelta(seconds=utc_offset))
+            timestamp = timestamp.replace(tzinfo=tz)
+        yield NumericEvent(timestamp, duration, nr_words)
+
+
+def parse_worker(ring_name: str, slot_size: int, tasks: Any, results: Any, validate: bool,
+                 event_name: Optional[str]) -> None:
+    '''
+    Parse the batches of lines into the slots of the ring buffer, until a None task.
+    For each batch, the number of records, the invalid lines and the number of filtered lines are sent back.
+    '''
+    # The ring buffer is owned, and unlinked, by the main process
+    ring = SharedMemory(name=ring_name)
+    reader = Reader("", validate=validate, event_name=event_name)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            slot, data = task
+            try:
+                offset = slot * slot_size
+                count = 0
+                errors: List[Tuple[int, str, str]] = []
+                filtered = reader.filtered_count
+                for index, line in enumerate(data.split(b"\n")):
+                    try:
+                        event = reader.parse_line(line)
+                    except InvalidEventError as e:
+                        errors.append((index, e.reason, str(e)))
+                        continue
+                    if event is not None:
+                        pack_event(ring.buf, offset + count * RECORD.size, event)
+                        count += 1
+                results.put((count, errors, reader.filtered_count - filtered))
+            except Exception as e:
+                results.put(e)
+    finally:
+        ring.close()
+
+
+class ParserPool:
+    '''
+    Pool of processes parsing the lines, so the parsing scales with the number of cores.
+    The batches of lines are dealt round-robin to the processes, which write compact records
+    to their ring buffer in shared memory. The batches are collected in the order they were sent,
+    so the events keep the order of the lines.
+    Only the timestamp, duration and nr_words of the events are kept.
+    '''
+
+    def __init__(self, workers: int, validate: bool = False, event_name: Optional[str] = None,
+                 batch_size: int = BATCH_SIZE, slots: int = RING_SLOTS) -> None:
+        if workers <= 0:
+            raise ValueError("The number of parse workers must be positive")
+        self.batch_size = batch_size
+        self.slots = slots
+        self.slot_size = batch_size * RECORD.size
+        self.next_batch = 0
+
+        self.rings: List[SharedMemory] = []
+        self.tasks: List[Any] = []
+        self.results: List[Any] = []
+        self.processes: List[multiprocessing.Process] = []
+        for _ in range(workers):
+            ring = SharedMemory(create=True, size=slots * self.slot_size)
+            tasks, results = multiprocessing.Queue(), multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=parse_worker, args=(ring.name, self.slot_size, tasks, results, validate, event_name), daemon=True
+            )
+            process.start()
+            self.rings.append(ring)
+            self.tasks.append(tasks)
+            self.results.append(results)
+            self.processes.append(process)
+
+    def decode(self, lines: Iterable[Tuple[bytes, int]], reader: Reader) -> Generator[NumericEvent, None, None]:
+        '''
+        Parse the lines with their byte offsets, the invalid lines are recorded in the bad lines of the reader
+        '''
+        # Batches sent and not collected yet, oldest first: (worker, slot, lines with their offsets)
+        in_flight: Deque[Tuple[int, int, List[Tuple[bytes, int]]]] = deque()
+        batch: List[Tuple[bytes, int]] = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) == self.batch_size:
+                yield from self.send(batch, in_flight, reader)
+                batch = []
+        if batch:
+            yield from self.send(batch, in_flight, reader)
+
+        while in_flight:
+            yield from self.collect(in_flight.popleft(), reader)
+
+    def send(self, batch: List[Tuple[bytes, int]], in_flight: Deque[Tuple[int, int, List[Tuple[bytes, int]]]],
+             reader: Reader) -> Generator[NumericEvent, None, None]:
+        '''
+        Send the batch to the next process, collecting first the oldest batch when every slot is in use
+        '''
+        if len(in_flight) == len(self.processes) * self.slots:
+            yield from self.collect(in_flight.popleft(), reader)
+
+        worker = self.next_batch % len(self.processes)
+        slot = self.next_batch // len(self.processes) % self.slots
+        self.next_batch += 1
+        # A single buffer is cheaper to send than a list of lines
+        self.tasks[worker].put((slot, b"\n".join([line for line, _ in batch])))
+        in_flight.append((worker, slot, batch))
+
+    def collect(self, sent: Tuple[int, int, List[Tuple[bytes, int]]], reader: Reader) -> Generator[NumericEvent, None, None]:
+        '''
+        Wait for the records of a batch and rebuild its events
+        '''
+        worker, slot, batch = sent
+        result = self.results[worker].get()
+        if isinstance(result, Exception):
+            raise result
+        count, errors, filtered = result
+
+        reader.filtered_count += filtered
+        for index, reason, message in errors:
+            line, position = batch[index]
+            reader.bad_lines.record(reader.filename, position, line.strip(), InvalidEventError(reason, message))
+
+        offset = slot * self.slot_size
+        yield from unpack_events(self.rings[worker].buf[offset:offset + self.slot_size], count)
+
+    def close(self) -> None:
+        '''
+        Stop the processes and free the ring buffers
+        '''
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        for ring in self.rings:
+            ring.close()
+            ring.unlink()
@@ -0,0 +1,121 @@
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from read import Reader, BadLines
+from workers import RECORD, ParserPool, pack_event, unpack_events
+
+
+def make_event_line(timestamp, duration=1.5, nr_words=10, event_name="translation_delivered"):
+    return json.dumps({
+        "timestamp": timestamp,
+        "translation_id": "123",
+        "source_language": "en",
+        "target_language": "fr",
+        "client_name": "TestClient",
+        "event_name": event_name,
+        "nr_words": nr_words,
+        "duration": duration
+    })
+
+
+@pytest.fixture
+def pool():
+    pool = ParserPool(2, batch_size=3, slots=2)
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    [
+        datetime(2018, 12, 26, 18, 11, 8),
+        datetime(2018, 12, 26, 18, 11, 8, 509654),
+        datetime(2025, 4, 21, 10, 0, tzinfo=timezone.utc),
+        datetime(2025, 4, 21, 10, 0, 0, 1, tzinfo=timezone(timedelta(hours=-5, minutes=-30))),
+        datetime(1969, 7, 20, 20, 17, 40),
+    ],
+    ids=["naive", "microseconds", "utc", "negative_offset", "before_epoch"]
+)
+def test_pack_unpack_roundtrip(timestamp):
+    """
+    Test that the compact record keeps the timestamp, its timezone, the duration and the words
+    """
+    buffer = bytearray(2 * RECORD.size)
+    pack_event(buffer, 0, SimpleNamespace(timestamp=timestamp, duration=20.5, nr_words=7))
+    pack_event(buffer, RECORD.size, SimpleNamespace(timestamp=timestamp, duration=3, nr_words=0))
+
+    events = list(unpack_events(buffer, 2))
+
+    assert [event.timestamp for event in events] == [timestamp, timestamp]
+    assert [event.timestamp.utcoffset() for event in events] == [timestamp.utcoffset()] * 2
+    assert [(event.duration, event.nr_words) for event in events] == [(20.5, 7), (3, 0)]
+
+
+def test_pool_keeps_order(pool):
+    """
+    Test that the events keep the order of the lines across more batches than the slots of the ring buffers
+    """
+    start = datetime(2025, 4, 21, 10, 0)
+    lines = [(make_event_line(str(start + timedelta(seconds=i)), duration=i).encode(), i * 100) for i in range(50)]
+
+    events = list(pool.decode(lines, Reader("")))
+
+    assert [event.duration for event in events] == list(range(50))
+    assert [event.timestamp for event in events] == [start + timedelta(seconds=i) for i in range(50)]
+
+    # The pool is reused for the next reads
+    assert [event.duration for event in pool.decode(lines[:4], Reader(""))] == [0, 1, 2, 3]
+
+
+def test_pool_bad_lines_and_filter(tmp_path):
+    """
+    Test that the invalid lines are recorded with their byte offset, and the filtered lines counted
+    """
+    pool = ParserPool(2, event_name="translation_delivered", batch_size=2)
+    dead_letter = tmp_path / "dead_letter.json"
+    reader = Reader("events.json", bad_lines=BadLines(str(dead_letter)), event_name="translation_delivered")
+    lines = [
+        (make_event_line("2025-04-21 10:00:00").encode(), 0),
+        (b'{"event_name": "translation_delivered", not valid json}', 200),
+        (make_event_line("2025-04-21 10:00:01", event_name="translation_requested").encode(), 300),
+        (make_event_line("2025-04-21 10:00:02", duration=-1).encode(), 500),
+        (make_event_line("2025-04-21 10:00:03").encode(), 700),
+    ]
+
+    try:
+        events = list(pool.decode(lines, reader))
+    finally:
+        pool.close()
+    reader.bad_lines.close()
+
+    assert [event.timestamp.second for event in events] == [0, 3]
+    assert reader.filtered_count == 1
+    assert [json.loads(line)["offset"] for line in dead_letter.read_text().splitlines()] == [200, 500]
+    assert reader.bad_lines.total == 2
+
+
+def test_reader_with_pool(tmp_path, pool):
+    """
+    Test that a reader parsing with the pool reads the same events as without it, also in live mode
+    """
+    file = tmp_path / "events.json"
+    file.write_text("\n".join(make_event_line(f"2025-04-21 10:{i:02d}:00", duration=i) for i in range(10)) + "\n\n")
+
+    expected = [(event.timestamp, event.duration, event.nr_words) for event in Reader(str(file)).read_existing_events()]
+    reader = Reader(str(file), keep_reading_live=True, parser_pool=pool)
+    events = [(event.timestamp, event.duration, event.nr_words) for event in reader.read_existing_events()]
+    assert events == expected
+
+    with open(file, "a") as f:
+        f.write(make_event_line("2025-04-21 10:10:00", duration=10) + "\n")
+    assert [event.duration for event in reader.read_new_events()] == [10]
+    reader.live_file.close()
+
+
+def test_pool_invalid_workers():
+    """
+    Test that the pool needs at least one process
+    """
+    with pytest.raises(ValueError, match="The number of parse workers must be positive"):
+        ParserPool(0)
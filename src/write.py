@@ -1,25 +1,272 @@
+import os
+import sys
 import json
+import time
+import queue
+import threading
+from datetime import datetime, timedelta
+from typing import IO, Any, Dict, Generator, Iterable, List, Optional, Union
+
+# Maximum number of records waiting to be written by the background thread
+BACKGROUND_QUEUE_SIZE = 4096
+
+
+class DeltaEncoder:
+    '''
+    Class to drop the results with the same value as the previous one.
+    The full series can be rebuilt with expand_deltas, since a dropped minute repeats the previous value.
+    '''
+
+    def __init__(self, heartbeat: Optional[int] = None) -> None:
+        # Emit a result at least every heartbeat minutes, even without changes
+        self.heartbeat = heartbeat
+        self.last_value: Optional[Dict[str, Any]] = None
+        self.suppressed: Optional[Dict[str, Any]] = None
+        self.since_emitted = 0
+
+    def encode(self, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        '''
+        Return the result if it has to be written, None otherwise
+        '''
+        value = {key: item for key, item in result.items() if key != "date"}
+        if value == self.last_value and (self.heartbeat is None or self.since_emitted + 1 < self.heartbeat):
+            self.since_emitted += 1
+            self.suppressed = result
+            return None
+
+        self.last_value = value
+        self.since_emitted = 0
+        self.suppressed = None
+        return result
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        '''
+        Return the last dropped result, so the end of the series is known
+        '''
+        result, self.suppressed = self.suppressed, None
+        return result
+
+
+def expand_deltas(results: Iterable[Dict[str, Any]], step: timedelta = timedelta(minutes=1)) -> Generator[Dict[str, Any], None, None]:
+    '''
+    Rebuild the full series from the results written with changes_only, repeating each value until the next one
+    '''
+    previous: Optional[Dict[str, Any]] = None
+    for result in results:
+        if previous is not None:
+            date = datetime.fromisoformat(previous["date"]) + step
+            end = datetime.fromisoformat(result["date"])
+            while date < end:
+                yield dict(previous, date=str(date))
+                date += step
+        yield result
+        previous = result
+
+
+class CliSink:
+    '''
+    Class to write the records in the command-line, separated by an empty line
+    '''
+
+    def write(self, records: List[str]) -> None:
+        sys.stdout.write("".join(record + "\n" for record in records))
+        sys.stdout.flush()
+
+    def sync(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FileSink:
+    '''
+    Class to append the records to a file, optionally rotating it by size or by time.
+    The rotated files are renamed with an increasing suffix: output.json.1, output.json.2, ...
+    '''
+
+    def __init__(self, path: str, rotate_bytes: Optional[int] = None, rotate_seconds: Optional[float] = None) -> None:
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.output: Optional[IO[str]] = None
+        self.size = 0
+        self.opened_at = 0.0
+        self.rotations = 0
+
+    def open(self) -> None:
+        self.output = open(self.path, 'a')
+        self.size = self.output.tell()
+        self.opened_at = time.time()
+
+    def should_rotate(self, size: int) -> bool:
+        '''
+        Check if the file must be rotated before writing size more bytes
+        '''
+        if self.size == 0:
+            return False
+        if self.rotate_bytes is not None and self.size + size > self.rotate_bytes:
+            return True
+        return self.rotate_seconds is not None and time.time() - self.opened_at >= self.rotate_seconds
+
+    def rotate(self) -> None:
+        '''
+        Rename the current file to the next free suffix and start a new one
+        '''
+        self.output.close()
+        self.rotations += 1
+        while os.path.exists(f"{self.path}.{self.rotations}"):
+            self.rotations += 1
+        os.rename(self.path, f"{self.path}.{self.rotations}")
+        self.open()
+
+    def write(self, records: List[str]) -> None:
+        if self.output is None:
+            self.open()
+
+        text = "".join(records)
+        if self.should_rotate(len(text)):
+            self.rotate()
+
+        self.output.write(text)
+        self.output.flush()
+        self.size += len(text)
+
+    def sync(self) -> None:
+        if self.output is not None:
+            os.fsync(self.output.fileno())
+
+    def close(self) -> None:
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+
+
+def create_sink(output: Union[str, Dict[str, Any]], rotate_bytes: Optional[int] = None,
+                rotate_seconds: Optional[float] = None) -> Union[CliSink, FileSink]:
+    '''
+    Create the sink of an output: "cli", a file path, or a dict with the path and its own rotation
+    '''
+    if isinstance(output, dict):
+        return FileSink(output["path"], output.get("rotate_bytes", rotate_bytes), output.get("rotate_seconds", rotate_seconds))
+    if output == 'cli':
+        return CliSink()
+    return FileSink(output, rotate_bytes, rotate_seconds)
+
+
+class BackgroundSink:
+    '''
+    Class to write the records in a dedicated thread, so slow disks don't stall the processing.
+    The records waiting in the queue are written together in a single write call to each sink.
+    '''
+
+    def __init__(self, sinks: List[Union[CliSink, FileSink]], fsync: bool = False, queue_size: int = BACKGROUND_QUEUE_SIZE) -> None:
+        self.sinks = sinks
+        self.fsync = fsync
+        self.pending: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=queue_size)
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, record: str) -> None:
+        '''
+        Queue the record to be written, waiting if the queue is full
+        '''
+        if self.error is not None:
+            raise self.error
+        self.pending.put(record)
+
+    def _run(self) -> None:
+        '''
+        Write the queued records in batches until the sink is closed
+        '''
+        try:
+            closed = False
+            while not closed:
+                batch: List[str] = [self.pending.get()]
+                while True:
+                    try:
+                        batch.append(self.pending.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if batch[-1] is None:
+                    closed = True
+                    batch.pop()
+                if batch:
+                    self._write_batch(batch)
+        except BaseException as e:
+            self.error = e
+            # Keep consuming so the processing is not blocked on a full queue
+            while self.pending.get() is not None:
+                pass
+
+    def _write_batch(self, batch: List[str]) -> None:
+        for sink in self.sinks:
+            sink.write(batch)
+            if self.fsync:
+                sink.sync()
+
+    def close(self) -> None:
+        '''
+        Write all the queued records and stop the thread
+        '''
+        if self.thread.is_alive():
+            self.pending.put(None)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
 
 class Writer:
     '''
-    Class to write the results to file or cli
+    Class to write the results to one or more destinations, files or cli.
+    Each result is serialized once and the same text is written to every destination.
     '''
     
-    def __init__(self, output_destiny: str):
+    def __init__(self, output_destiny: Union[str, List[Union[str, Dict[str, Any]]]], changes_only: bool = False,
+                 heartbeat: Optional[int] = None, background: bool = False, fsync: bool = False,
+                 rotate_bytes: Optional[int] = None, rotate_seconds: Optional[float] = None):
         self.output_destiny = output_destiny      
+        outputs = output_destiny if isinstance(output_destiny, list) else [output_destiny]
+        self.sinks = [create_sink(output, rotate_bytes, rotate_seconds) for output in outputs]
+        self.delta_encoder: Optional[DeltaEncoder] = DeltaEncoder(heartbeat) if changes_only else None
+        self.background_sink: Optional[BackgroundSink] = BackgroundSink(self.sinks, fsync) if background else None
     
     def write(self, result: dict):
         '''
         Write the results to file or cli
         '''
+        if self.delta_encoder is not None:
+            result = self.delta_encoder.encode(result)
+            if result is None:
+                return
+
+        self.write_record(result)
+
+    def write_record(self, result: dict):
+        '''
+        Serialize a single record and write it to every destination
+        '''
+        record = json.dumps(result) + "\n"
+        if self.background_sink is not None:
+            self.background_sink.put(record)
+        else:
+            for sink in self.sinks:
+                sink.write([record])
+
+    def close(self):
+        '''
+        Write the pending results and close the destinations
+        '''
+        if self.delta_encoder is not None:
+            result = self.delta_encoder.flush()
+            if result is not None:
+                self.write_record(result)
 
-        if self.output_destiny == 'cli':
-            # Write the result in command-line
-            print(f"{json.dumps(result)}\n")
-            
-        else:    
-            # Write the result to file
-            with open(self.output_destiny, 'a') as f_out:
-                json.dump(result, f_out)
-                f_out.write("\n")
-        
\ No newline at end of file
+        try:
+            if self.background_sink is not None:
+                self.background_sink.close()
+        finally:
+            for sink in self.sinks:
+                sink.close()
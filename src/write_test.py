@@ -1,6 +1,8 @@
 import json
+import time
+import threading
 import pytest
-from write import Writer
+from write import Writer, BackgroundSink, FileSink, expand_deltas
 
 @pytest.mark.parametrize(
     "output_destiny, result, expected_output, is_cli",
@@ -82,3 +84,184 @@ def test_writer_append_behavior(tmp_path, initial_content, new_result, expected_
     # Read all non-empty lines and compare
     lines = [line for line in file_path.read_text().splitlines() if line]
     assert lines == expected_lines
+
+SERIES = [
+    {"date": "2025-04-20 12:00:00", "average_delivery_time": 0.0},
+    {"date": "2025-04-20 12:01:00", "average_delivery_time": 10},
+    {"date": "2025-04-20 12:02:00", "average_delivery_time": 10},
+    {"date": "2025-04-20 12:03:00", "average_delivery_time": 10},
+    {"date": "2025-04-20 12:04:00", "average_delivery_time": 10},
+    {"date": "2025-04-20 12:05:00", "average_delivery_time": 15},
+    {"date": "2025-04-20 12:06:00", "average_delivery_time": 15},
+    {"date": "2025-04-20 12:07:00", "average_delivery_time": 15},
+]
+
+@pytest.mark.parametrize(
+    "heartbeat, expected_minutes",
+    [
+        # Only changes, plus the last minute on close
+        (None, ["12:00", "12:01", "12:05", "12:07"]),
+        # At least one result every 2 minutes
+        (2, ["12:00", "12:01", "12:03", "12:05", "12:07"]),
+    ],
+    ids=[
+        "changes_only",
+        "with_heartbeat"
+    ]
+)
+def test_writer_changes_only(tmp_path, heartbeat, expected_minutes):
+    """
+    Test that only changed values are written, and that the full series can be rebuilt
+    """
+    file_path = tmp_path / "deltas.json"
+    writer = Writer(str(file_path), changes_only=True, heartbeat=heartbeat)
+    for result in SERIES:
+        writer.write(result)
+    writer.close()
+
+    written = [json.loads(line) for line in file_path.read_text().splitlines()]
+    assert [r["date"][11:16] for r in written] == expected_minutes
+    assert list(expand_deltas(written)) == SERIES
+
+def test_writer_close_without_pending(tmp_path):
+    """
+    Test that close writes nothing when the last result was already written
+    """
+    file_path = tmp_path / "deltas.json"
+    writer = Writer(str(file_path), changes_only=True)
+    writer.write(SERIES[0])
+    writer.close()
+    Writer(str(file_path)).close()
+
+    assert file_path.read_text().splitlines() == [json.dumps(SERIES[0])]
+
+@pytest.mark.parametrize("fsync", [False, True], ids=["no_fsync", "fsync"])
+def test_writer_background(tmp_path, monkeypatch, fsync):
+    """
+    Test that the background writer drains every queued record on close
+    """
+    synced = []
+    monkeypatch.setattr("os.fsync", lambda fd: synced.append(fd))
+    file_path = tmp_path / "background.json"
+
+    writer = Writer(str(file_path), background=True, fsync=fsync)
+    for i in range(1000):
+        writer.write({"i": i})
+    writer.close()
+
+    assert file_path.read_text().splitlines() == [json.dumps({"i": i}) for i in range(1000)]
+    assert not writer.background_sink.thread.is_alive()
+    assert bool(synced) == fsync
+
+def test_writer_background_batches(tmp_path, monkeypatch):
+    """
+    Test that the records queued while a batch is written are written together
+    """
+    writes = []
+    release = threading.Event()
+    sink = BackgroundSink([FileSink(str(tmp_path / "out.json"))])
+    original = sink._write_batch
+
+    def slow_write_batch(batch):
+        release.wait()
+        writes.append(len(batch))
+        original(batch)
+
+    monkeypatch.setattr(sink, "_write_batch", slow_write_batch)
+    for i in range(10):
+        sink.put(f"{i}\n")
+    release.set()
+    sink.close()
+
+    assert sum(writes) == 10
+    assert len(writes) < 10
+
+def test_writer_background_cli(capsys):
+    """
+    Test that the background writer prints the same as the synchronous one
+    """
+    writer = Writer("cli", background=True)
+    writer.write({"foo": 1})
+    writer.close()
+
+    assert capsys.readouterr().out == json.dumps({"foo": 1}) + "\n\n"
+
+def test_writer_background_error(tmp_path):
+    """
+    Test that an error in the background thread is raised to the caller
+    """
+    writer = Writer(str(tmp_path / "missing_dir" / "out.json"), background=True)
+    writer.write({"foo": 0})
+    while writer.background_sink.error is None:
+        time.sleep(0.01)
+
+    with pytest.raises(FileNotFoundError):
+        writer.write({"foo": 1})
+    with pytest.raises(FileNotFoundError):
+        writer.close()
+
+def test_writer_multiple_outputs(tmp_path, capsys):
+    """
+    Test that each result is written to every destination
+    """
+    file_a = tmp_path / "a.json"
+    file_b = tmp_path / "b.json"
+    writer = Writer([str(file_a), "cli", {"path": str(file_b)}])
+    writer.write({"x": 1})
+    writer.write({"x": 2})
+    writer.close()
+
+    expected = json.dumps({"x": 1}) + "\n" + json.dumps({"x": 2}) + "\n"
+    assert file_a.read_text() == expected
+    assert file_b.read_text() == expected
+    assert capsys.readouterr().out == json.dumps({"x": 1}) + "\n\n" + json.dumps({"x": 2}) + "\n\n"
+
+def test_writer_serializes_once(tmp_path, monkeypatch):
+    """
+    Test that a result is serialized once whatever the number of destinations
+    """
+    calls = []
+    original_dumps = json.dumps
+    monkeypatch.setattr("write.json.dumps", lambda obj: calls.append(obj) or original_dumps(obj))
+
+    writer = Writer([str(tmp_path / f"{i}.json") for i in range(5)])
+    writer.write({"x": 1})
+    writer.close()
+
+    assert len(calls) == 1
+
+def test_file_sink_rotate_by_size(tmp_path):
+    """
+    Test that the file is rotated before growing over the maximum size
+    """
+    path = tmp_path / "out.json"
+    record = json.dumps({"x": 1}) + "\n"
+    sink = FileSink(str(path), rotate_bytes=len(record) * 2)
+    for _ in range(5):
+        sink.write([record])
+    sink.close()
+
+    assert (tmp_path / "out.json.1").read_text() == record * 2
+    assert (tmp_path / "out.json.2").read_text() == record * 2
+    assert path.read_text() == record
+
+def test_file_sink_rotate_by_time(tmp_path, monkeypatch):
+    """
+    Test that the file is rotated once the interval elapsed, keeping the existing rotated files
+    """
+    now = [1000.0]
+    monkeypatch.setattr("write.time.time", lambda: now[0])
+    path = tmp_path / "out.json"
+    (tmp_path / "out.json.1").write_text("old\n")
+
+    sink = FileSink(str(path), rotate_seconds=60)
+    sink.write(["a\n"])
+    now[0] += 30
+    sink.write(["b\n"])
+    now[0] += 30
+    sink.write(["c\n"])
+    sink.close()
+
+    assert (tmp_path / "out.json.1").read_text() == "old\n"
+    assert (tmp_path / "out.json.2").read_text() == "a\nb\n"
+    assert path.read_text() == "c\n"